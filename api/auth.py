@@ -71,6 +71,9 @@ class ApiKeyResource(Resource):
             user.api_key = str(uuid.uuid4())
             from app import db
             db.session.commit()
+            
+            from services.user_cache import invalidate_cached_user
+            invalidate_cached_user(user.id)
         
         return {
             'api_key': user.api_key,
@@ -86,6 +89,9 @@ class ApiKeyResource(Resource):
         from app import db
         db.session.commit()
         
+        from services.user_cache import invalidate_cached_user
+        invalidate_cached_user(user.id)
+        
         return {
             'api_key': user.api_key,
             'username': user.username,
@@ -102,7 +108,7 @@ class TokenResource(Resource):
         
         user = User.query.filter_by(email=data['email']).first()
         
-        if not user or not user.check_password(data['password']):
+        if not User.verify_login(user, data['password']):
             return {'error': 'Invalid email or password'}, 401
         
         # Generate a token valid for 24 hours
@@ -132,16 +138,18 @@ def setup_auth_routes(app, api):
     # User registration endpoint
     @app.route('/api/auth/register', methods=['POST'])
     def register():
+        from app import db
+        
         data = request.get_json() or {}
         
         if not data.get('username') or not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Username, email, and password are required'}), 400
         
         # Check if user already exists
-        if User.query.filter_by(username=data['username']).first():
+        if db.session.query(User.query.filter_by(username=data['username']).exists()).scalar():
             return jsonify({'error': 'Username already exists'}), 400
         
-        if User.query.filter_by(email=data['email']).first():
+        if db.session.query(User.query.filter_by(email=data['email']).exists()).scalar():
             return jsonify({'error': 'Email already registered'}), 400
         
         # Create new user
@@ -152,7 +160,6 @@ def setup_auth_routes(app, api):
         )
         user.set_password(data['password'])
         
-        from app import db
         db.session.add(user)
         db.session.commit()
         
@@ -1,8 +1,11 @@
 from flask import request, g
 from flask_restful import Resource
+from sqlalchemy import delete
 from api.auth import auth
 from models import Brief, Document
 from services.brief_generator import generate_brief
+from services.dashboard_service import get_dashboard_stats, invalidate_dashboard_cache
+from services.pagination import offset_paginate
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,9 +20,14 @@ class BriefListResource(Resource):
         # Enforce limits on pagination
         per_page = min(per_page, 100)
         
-        briefs = Brief.query.filter_by(user_id=g.current_user.id).order_by(
+        page = max(page, 1)
+        
+        # The total is the cached dashboard counter rather than a COUNT(*) per page, so it is
+        # approximate; has_next comes from fetching one row past the page
+        total = get_dashboard_stats(g.current_user.id)['brief_count']
+        briefs = offset_paginate(Brief.query.filter_by(user_id=g.current_user.id).order_by(
             Brief.generated_at.desc()
-        ).paginate(page=page, per_page=per_page)
+        ), page, per_page, total)
         
         result = {
             'items': [
@@ -37,7 +45,9 @@ class BriefListResource(Resource):
                 'page': briefs.page,
                 'per_page': briefs.per_page,
                 'total': briefs.total,
-                'pages': briefs.pages
+                'pages': briefs.pages,
+                'has_next': briefs.has_next,
+                'has_prev': briefs.has_prev
             }
         }
         
@@ -66,6 +76,7 @@ class BriefListResource(Resource):
             brief = generate_brief(document, 
                                    custom_title=data.get('title'),
                                    focus_areas=data.get('focus_areas', []))
+            invalidate_dashboard_cache(g.current_user.id)
             
             return {
                 'id': brief.id,
@@ -108,15 +119,18 @@ class BriefResource(Resource):
     @auth.login_required
     def delete(self, brief_id):
         """Delete a brief."""
-        brief = Brief.query.filter_by(id=brief_id, user_id=g.current_user.id).first()
+        # Delete the brief with a keyed DELETE scoped to the user
+        from app import db
+        result = db.session.execute(
+            delete(Brief).where(Brief.id == brief_id, Brief.user_id == g.current_user.id)
+            .execution_options(synchronize_session=False)
+        )
         
-        if not brief:
+        if result.rowcount == 0:
             return {'error': 'Brief not found or you do not have permission to access it'}, 404
         
-        # Delete the brief from the database
-        from app import db
-        db.session.delete(brief)
         db.session.commit()
+        invalidate_dashboard_cache(g.current_user.id)
         
         return {'message': 'Brief deleted successfully'}
 
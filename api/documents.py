@@ -1,13 +1,17 @@
 from flask import request, jsonify, g, current_app
 from flask_restful import Resource
+from sqlalchemy.orm import selectinload
 import os
-import uuid
 from werkzeug.utils import secure_filename
 from api.auth import auth, require_api_key
 from models import Document, Statute, User
 from services.document_parser import document_parser, is_allowed_file
+from services.upload_service import unique_upload_filename, save_file_storage
+from services.dashboard_service import get_dashboard_stats, invalidate_dashboard_cache
+from services.pagination import offset_paginate
 from services.text_analysis import analyze_document, store_statutes
 from services.statute_validator import validate_statutes
+from services.tasks import process_document
 import logging
 
 # Import for improved statute extraction
@@ -19,6 +23,18 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+def respond_async_requested():
+    """Whether the client sent ``Prefer: respond-async`` to have processing queued (RFC 7240)."""
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+def queue_document_processing(document):
+    """Mark a new document as queued and hand it to the processing task."""
+    from app import db
+    document.processing_state = 'queued'
+    db.session.commit()
+    process_document.delay(document.id)
+    logger.info(f"Queued document ID {document.id} for processing")
+
 class DocumentListResource(Resource):
     @auth.login_required
     def get(self):
@@ -29,9 +45,14 @@ class DocumentListResource(Resource):
         # Enforce limits on pagination
         per_page = min(per_page, 100)
         
-        documents = Document.query.filter_by(user_id=g.current_user.id).order_by(
+        page = max(page, 1)
+        
+        # The total is the cached dashboard counter rather than a COUNT(*) per page, so it is
+        # approximate; has_next comes from fetching one row past the page
+        total = get_dashboard_stats(g.current_user.id)['document_count']
+        documents = offset_paginate(Document.query.filter_by(user_id=g.current_user.id).order_by(
             Document.uploaded_at.desc()
-        ).paginate(page=page, per_page=per_page)
+        ), page, per_page, total)
         
         result = {
             'items': [
@@ -50,7 +71,9 @@ class DocumentListResource(Resource):
                 'page': documents.page,
                 'per_page': documents.per_page,
                 'total': documents.total,
-                'pages': documents.pages
+                'pages': documents.pages,
+                'has_next': documents.has_next,
+                'has_prev': documents.has_prev
             }
         }
         
@@ -86,16 +109,13 @@ class DocumentListResource(Resource):
         if not is_allowed_file(file.filename):
             return {'error': 'File type not allowed'}, 400
         
-        # Ensure the upload folder exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Generate a secure filename with UUID to prevent filename collisions
+        # Generate a secure, time-sortable filename to prevent filename collisions
         original_filename = secure_filename(file.filename)
-        filename = f"{uuid.uuid4()}_{original_filename}"
+        filename = unique_upload_filename(file.filename)
         file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         
-        # Save the file
-        file.save(file_path)
+        # Save the file, taking its size and hash from the same write
+        file_size, sha256 = save_file_storage(file, file_path)
         
         # Create a new document record in the database
         from app import db
@@ -103,7 +123,8 @@ class DocumentListResource(Resource):
             filename=filename,
             original_filename=original_filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
+            sha256=sha256,
             content_type=file.content_type,
             user_id=g.current_user.id,
             processed=False
@@ -111,8 +132,19 @@ class DocumentListResource(Resource):
         
         db.session.add(document)
         db.session.commit()
+        invalidate_dashboard_cache(g.current_user.id)
         
-        # Process the document asynchronously
+        # Clients that can poll the document opt into background processing
+        if respond_async_requested():
+            queue_document_processing(document)
+            return {
+                'id': document.id,
+                'filename': document.original_filename,
+                'message': 'Document uploaded and queued for processing',
+                'processing_state': document.processing_state
+            }, 202
+        
+        # Process the document
         try:
             # Parse document content
             text_content = document_parser.parse_document(file_path)
@@ -140,6 +172,7 @@ class DocumentListResource(Resource):
             # Mark the document as processed
             document.processed = True
             db.session.commit()
+            invalidate_dashboard_cache(g.current_user.id)
             
             return {
                 'id': document.id,
@@ -164,7 +197,10 @@ class DocumentResource(Resource):
     @auth.login_required
     def get(self, document_id):
         """Get details of a specific document."""
-        document = Document.query.filter_by(id=document_id, user_id=g.current_user.id).first()
+        document = Document.query.options(
+            selectinload(Document.briefs),
+            selectinload(Document.statutes)
+        ).filter_by(id=document_id, user_id=g.current_user.id).first()
         
         if not document:
             return {'error': 'Document not found or you do not have permission to access it'}, 404
@@ -177,6 +213,7 @@ class DocumentResource(Resource):
             'content_type': document.content_type,
             'uploaded_at': document.uploaded_at.isoformat(),
             'processed': document.processed,
+            'processing_state': document.processing_state,
             'processing_error': document.processing_error,
             'briefs': [
                 {
@@ -205,17 +242,17 @@ class DocumentResource(Resource):
         if not document:
             return {'error': 'Document not found or you do not have permission to access it'}, 404
         
-        # Delete the physical file
-        try:
-            if os.path.exists(document.file_path):
-                os.remove(document.file_path)
-        except Exception as e:
-            logger.error(f"Error deleting file: {str(e)}")
+        file_path = document.file_path
         
         # Delete the document from the database (cascade will handle related records)
         from app import db
         db.session.delete(document)
         db.session.commit()
+        invalidate_dashboard_cache(g.current_user.id)
+        
+        # Delete the physical file in the background
+        from services.tasks import remove_files
+        remove_files.delay([file_path])
         
         return {'message': 'Document deleted successfully'}
 
@@ -249,16 +286,13 @@ def setup_document_routes(app, api):
         if not is_allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed'}), 400
         
-        # Ensure the upload folder exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Generate a secure filename with UUID to prevent filename collisions
+        # Generate a secure, time-sortable filename to prevent filename collisions
         original_filename = secure_filename(file.filename)
-        filename = f"{uuid.uuid4()}_{original_filename}"
+        filename = unique_upload_filename(file.filename)
         file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
         
-        # Save the file
-        file.save(file_path)
+        # Save the file, taking its size and hash from the same write
+        file_size, sha256 = save_file_storage(file, file_path)
         
         # Create a new document record in the database
         from app import db
@@ -266,7 +300,8 @@ def setup_document_routes(app, api):
             filename=filename,
             original_filename=original_filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
+            sha256=sha256,
             content_type=file.content_type,
             user_id=g.current_user.id,
             processed=False
@@ -274,6 +309,17 @@ def setup_document_routes(app, api):
         
         db.session.add(document)
         db.session.commit()
+        invalidate_dashboard_cache(g.current_user.id)
+        
+        # Clients that can poll the document opt into background processing
+        if respond_async_requested():
+            queue_document_processing(document)
+            return jsonify({
+                'success': True,
+                'document_id': document.id,
+                'processing_state': document.processing_state,
+                'message': 'Document uploaded and queued for processing'
+            }), 202
         
         # Process the document
         try:
@@ -303,6 +349,7 @@ def setup_document_routes(app, api):
             # Mark the document as processed
             document.processed = True
             db.session.commit()
+            invalidate_dashboard_cache(g.current_user.id)
             
             return jsonify({
                 'success': True,
@@ -7,7 +7,7 @@ from typing import Dict, Any
 
 from flask import Blueprint, request, jsonify, current_app, g
 from flask_httpauth import HTTPTokenAuth
-from werkzeug.utils import secure_filename
+from services.upload_service import unique_upload_filename
 
 from services.integration_service import integration_service
 from models import User
@@ -71,11 +71,8 @@ def upload_file(provider):
     
     try:
         # Save the uploaded file temporarily
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'temp', filename)
-        
-        # Ensure the temp directory exists
-        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        filename = unique_upload_filename(file.filename)
+        temp_path = os.path.join(current_app.config['UPLOAD_TEMP_FOLDER'], filename)
         
         file.save(temp_path)
         
@@ -105,9 +102,6 @@ def download_file(provider, file_id):
     """
     try:
         # Download the file to a temporary location
-        temp_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
         downloaded_path = integration_service.download_file(provider, file_id)
         
         # Return the file as an attachment
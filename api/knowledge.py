@@ -5,7 +5,7 @@ from flask import request, g
 from flask_restful import Resource
 
 from api.auth import require_api_key
-from models import db, KnowledgeEntry, Tag, Reference, Document
+from models import db, KnowledgeEntry, Reference, Document
 from services.knowledge_service import (
     create_knowledge_entry, 
     search_knowledge, 
@@ -13,8 +13,12 @@ from services.knowledge_service import (
     update_knowledge_entry, 
     delete_knowledge_entry, 
     extract_knowledge_from_document,
-    get_trending_tags
+    get_trending_tags,
+    get_all_tags,
+    get_or_create_tags,
+    invalidate_tag_cache
 )
+from services.dashboard_service import invalidate_dashboard_cache
 
 class KnowledgeListResource(Resource):
     @require_api_key
@@ -97,19 +101,14 @@ class KnowledgeListResource(Resource):
             
             # Add tags if provided
             if 'tags' in data and isinstance(data['tags'], list):
-                for tag_name in data['tags']:
-                    # Find or create the tag
-                    tag = Tag.query.filter_by(name=tag_name.lower()).first()
-                    if not tag:
-                        tag = Tag(name=tag_name.lower(), user_id=g.user.id)
-                        db.session.add(tag)
-                        db.session.flush()
-                    
+                for tag in get_or_create_tags(data['tags'], g.user.id):
                     # Add the tag to the entry
                     if tag not in entry.tags:
                         entry.tags.append(tag)
                 
                 db.session.commit()
+                invalidate_tag_cache()
+            invalidate_dashboard_cache(g.user.id)
             
             # Return the created entry
             return {
@@ -188,6 +187,7 @@ class KnowledgeEntryResource(Resource):
                 is_verified=data.get('is_verified'),
                 tags=data.get('tags')
             )
+            invalidate_dashboard_cache(g.user.id)
             
             # Return the updated entry
             return {
@@ -217,6 +217,7 @@ class KnowledgeEntryResource(Resource):
         
         # Delete the entry
         if delete_knowledge_entry(entry_id):
+            invalidate_dashboard_cache(g.user.id)
             return {'message': 'Knowledge entry deleted successfully'}, 200
         else:
             return {'error': 'Failed to delete knowledge entry'}, 500
@@ -228,17 +229,9 @@ class TagListResource(Resource):
         # Get trending tags
         trending = get_trending_tags(limit=10)
         
-        # Get all tags
-        all_tags = Tag.query.all()
-        all_tags_data = [{
-            'id': tag.id,
-            'name': tag.name,
-            'description': tag.description
-        } for tag in all_tags]
-        
         return {
             'trending': trending,
-            'all_tags': all_tags_data
+            'all_tags': get_all_tags()
         }
 
 class DocumentKnowledgeResource(Resource):
@@ -259,6 +252,7 @@ class DocumentKnowledgeResource(Resource):
         # Extract knowledge
         try:
             entries = extract_knowledge_from_document(document, g.user.id)
+            invalidate_dashboard_cache(g.user.id)
             
             # Return the created entries
             return {
@@ -3,6 +3,7 @@ from flask_restful import Resource
 from api.auth import auth
 from models import Statute, Document
 from services.statute_validator import revalidate_statute
+from services.dashboard_service import invalidate_dashboard_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -95,6 +96,7 @@ class StatuteResource(Resource):
         try:
             # Revalidate the statute
             updated_statute = revalidate_statute(statute)
+            invalidate_dashboard_cache(g.current_user.id)
             
             return {
                 'id': updated_statute.id,
@@ -3,11 +3,15 @@ Application factory module for creating and configuring the Flask app.
 """
 import os
 import logging
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from flask_restful import Api
 from flask_login import LoginManager
+from flask_caching import Cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,9 +21,21 @@ logger = logging.getLogger(__name__)
 class Base(DeclarativeBase):
     pass
 
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """Turn on foreign key enforcement, which SQLite leaves off for every new connection.
+
+    Document deletes rely on the ON DELETE CASCADE / SET NULL actions of the child tables.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
 # Initialize extensions
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
+cache = Cache()
 
 def create_app():
     """Create and configure the Flask application."""
@@ -43,12 +59,54 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Scratch space for files passing through to and from cloud storage
+    app.config['UPLOAD_TEMP_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
+    os.makedirs(app.config['UPLOAD_TEMP_FOLDER'], exist_ok=True)
+    
+    # Large file parts parsed by Werkzeug are spooled into the upload folder, so saving them is a hard link, not a copy
+    from services.upload_service import UploadRequest
+    app.request_class = UploadRequest
+    
+    # Let the front-end web server stream downloads (X-Sendfile for Apache, X-Accel-Redirect for nginx)
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    app.config['X_ACCEL_REDIRECT_PREFIX'] = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+    
+    # Built plugin zip packages, keyed by a fingerprint of the plugin sources
+    app.config['PLUGIN_CACHE_DIR'] = os.environ.get('PLUGIN_CACHE_DIR', os.path.join(app.instance_path, 'plugin_cache'))
+    
+    # Configure caching (SimpleCache per process unless a shared backend is configured)
+    app.config["CACHE_TYPE"] = os.environ.get("CACHE_TYPE", "SimpleCache")
+    app.config["CACHE_DEFAULT_TIMEOUT"] = 60
+    if os.environ.get("CACHE_MEMCACHED_SERVERS"):
+        app.config["CACHE_MEMCACHED_SERVERS"] = os.environ["CACHE_MEMCACHED_SERVERS"].split(",")
+    if os.environ.get("CACHE_REDIS_URL"):
+        app.config["CACHE_REDIS_URL"] = os.environ["CACHE_REDIS_URL"]
     
     # Initialize extensions with app
     db.init_app(app)
+    cache.init_app(app)
+    
+    # Optionally keep sessions server-side (e.g. SESSION_TYPE=memcached) instead of in signed cookies
+    if os.environ.get("SESSION_TYPE"):
+        try:
+            from flask_session import Session
+            app.config["SESSION_TYPE"] = os.environ["SESSION_TYPE"]
+            app.config["SESSION_PERMANENT"] = False
+            app.config["SESSION_USE_SIGNER"] = True
+            if app.config["SESSION_TYPE"] == "memcached" and os.environ.get("CACHE_MEMCACHED_SERVERS"):
+                from pymemcache.client.hash import HashClient
+                app.config["SESSION_MEMCACHED"] = HashClient(os.environ["CACHE_MEMCACHED_SERVERS"].split(","))
+            Session(app)
+            logger.info(f"Server-side sessions enabled ({app.config['SESSION_TYPE']})")
+        except ImportError as e:
+            logger.warning(f"Server-side sessions not enabled due to missing dependencies: {str(e)}")
     login_manager.init_app(app)
     login_manager.login_view = 'web_login'
     
+    # Log per-request query counts and flag likely N+1 patterns (debug or DB_QUERY_LOG_ENABLED)
+    from instrumentation import init_query_instrumentation
+    init_query_instrumentation(app)
+    
     # Add custom jinja filters
     @app.template_filter('escapejs')
     def escapejs_filter(s):
@@ -114,7 +172,8 @@ def create_app():
         # Set up login manager
         @login_manager.user_loader
         def load_user(user_id):
-            return User.query.get(int(user_id))
+            from services.user_cache import load_cached_user
+            return load_cached_user(int(user_id))
             
         # Initialize machine learning components
         from ml_layer.config import MLConfig
@@ -1,6 +1,8 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, SelectField, SelectMultipleField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from app import db
 from models import User
 
 class CSRFDisabledForm(FlaskForm):
@@ -23,15 +25,20 @@ class RegistrationForm(CSRFDisabledForm):
     submit = SubmitField('Register')
     
     def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
+        if db.session.query(User.query.filter_by(email=email.data).exists()).scalar():
             raise ValidationError('That email is already registered. Please use a different one.')
             
     def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
+        if db.session.query(User.query.filter_by(username=username.data).exists()).scalar():
             raise ValidationError('That username is already taken. Please choose a different one.')
             
+class UploadForm(CSRFDisabledForm):
+    file = FileField('Document', validators=[
+        FileRequired(),
+        FileAllowed(['pdf', 'doc', 'docx', 'txt', 'rtf'], 'Allowed formats: PDF, DOCX, DOC, TXT, RTF')
+    ])
+    submit = SubmitField('Upload Document')
+
 class KnowledgeEntryForm(CSRFDisabledForm):
     title = StringField('Title', validators=[DataRequired(), Length(max=255)])
     content = TextAreaField('Content', validators=[DataRequired()])
@@ -0,0 +1,86 @@
+"""
+Request-scoped SQL query instrumentation for catching N+1 regressions.
+
+Enabled when the app runs in debug mode or DB_QUERY_LOG_ENABLED is set. Every
+statement executed during a request is recorded on ``flask.g``; after the
+request the total is logged and any statement repeated more than
+DUPLICATE_QUERY_THRESHOLD times is flagged as a likely N+1. If nplusone is
+installed it also reports lazy loads at WARNING, or raises when NPLUSONE_RAISE
+is set (for CI smoke runs).
+"""
+import os
+import logging
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# A statement executed more often than this within one request is reported
+DUPLICATE_QUERY_THRESHOLD = 3
+
+def query_logging_enabled(app):
+    """Check whether query instrumentation should be installed for the app."""
+    flag = os.environ.get('DB_QUERY_LOG_ENABLED', '').lower() in ('1', 'true', 'yes')
+    return flag or app.debug
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        context._query_start_time = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    if '_queries' not in g:
+        g._queries = []
+    # Statements carry placeholders, not values, so repeats of one query compare equal
+    elapsed = time.perf_counter() - getattr(context, '_query_start_time', time.perf_counter())
+    g._queries.append((statement, elapsed))
+
+def _log_request_queries(response):
+    queries = g.pop('_queries', [])
+    if not queries:
+        return response
+
+    total_time = sum(elapsed for _, elapsed in queries) * 1000
+    logger.info(f"{request.method} {request.path}: {len(queries)} queries in {total_time:.1f} ms")
+
+    counts = Counter(' '.join(statement.split()) for statement, _ in queries)
+    for statement, count in counts.items():
+        if count > DUPLICATE_QUERY_THRESHOLD:
+            logger.warning(
+                f"Possible N+1 on {request.method} {request.path}: statement ran {count} times: {statement[:300]}"
+            )
+    return response
+
+def init_query_instrumentation(app):
+    """
+    Install the per-request query counter if instrumentation is enabled.
+
+    Args:
+        app: The Flask application
+
+    Returns:
+        bool: True if the instrumentation was installed
+    """
+    if not query_logging_enabled(app):
+        return False
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.after_request(_log_request_queries)
+    logger.info("Request query instrumentation enabled")
+
+    # nplusone pinpoints the lazy-loaded relationship behind an N+1, when installed
+    try:
+        from nplusone.ext.flask_sqlalchemy import NPlusOne
+        app.config.setdefault('NPLUSONE_LOG_LEVEL', logging.WARNING)
+        # CI smoke runs set NPLUSONE_RAISE so a new lazy load fails the request instead of just logging
+        app.config.setdefault('NPLUSONE_RAISE', os.environ.get('NPLUSONE_RAISE', '').lower() in ('1', 'true', 'yes'))
+        NPlusOne(app)
+        logger.info("nplusone lazy-load detection enabled")
+    except ImportError:
+        pass
+    return True
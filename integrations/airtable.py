@@ -18,7 +18,9 @@ from pyairtable import Api, Base, Table
 from pyairtable.utils import attachment
 
 from app import db
-from models import Document, KnowledgeEntry, Tag, AirtableCredential
+from models import Document, KnowledgeEntry, AirtableCredential
+from services.knowledge_service import get_or_create_tags, invalidate_tag_cache
+from services.dashboard_service import invalidate_dashboard_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -388,14 +390,22 @@ def import_knowledge():
         # Get all records from the Knowledge Entries table
         records = knowledge_table.all()
         
+        # Skip our own entries that were synced to Airtable
+        records = [record for record in records if 'EntryID' not in record['fields']]
+        
+        # Resolve every tag used by the import in one lookup instead of a query per tag
+        record_tag_names = [
+            list(dict.fromkeys(name.lower() for name in map(str.strip, (record['fields'].get('Tags') or '').split(',')) if name))
+            for record in records
+        ]
+        tags_by_name = {tag.name: tag for tag in get_or_create_tags(
+            [name for names in record_tag_names for name in names], current_user.id
+        )}
+        
         import_count = 0
-        for record in records:
+        for record, tag_names in zip(records, record_tag_names):
             fields = record['fields']
             
-            # Skip if this is one of our own entries that was synced to Airtable
-            if 'EntryID' in fields:
-                continue
-            
             # Create a new knowledge entry from Airtable data
             entry = KnowledgeEntry(
                 user_id=current_user.id,
@@ -409,29 +419,15 @@ def import_knowledge():
                 updated_at=datetime.utcnow()
             )
             
-            # Add tags if they exist
-            if 'Tags' in fields and fields['Tags']:
-                tag_names = [t.strip() for t in fields['Tags'].split(',')]
-                
-                for tag_name in tag_names:
-                    # Check if tag already exists
-                    tag = Tag.query.filter_by(name=tag_name).first()
-                    if not tag:
-                        # Create the tag
-                        tag = Tag(
-                            name=tag_name,
-                            user_id=current_user.id,
-                            created_at=datetime.utcnow()
-                        )
-                        db.session.add(tag)
-                    
-                    # Add the tag to this entry
-                    entry.tags.append(tag)
+            # Attach the tags resolved above
+            entry.tags = [tags_by_name[name] for name in tag_names]
             
             db.session.add(entry)
             import_count += 1
         
         db.session.commit()
+        invalidate_tag_cache()
+        invalidate_dashboard_cache(current_user.id)
         flash(f'Successfully imported {import_count} knowledge entries from Airtable.', 'success')
         return redirect(url_for('airtable.dashboard'))
     
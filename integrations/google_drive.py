@@ -24,6 +24,7 @@ from google_auth_oauthlib.flow import Flow
 
 from app import db
 from models import GoogleCredential, Document
+from services.dashboard_service import invalidate_dashboard_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -394,8 +395,7 @@ def download_file(file_id):
         request = service.files().get_media(fileId=file_id)
         
         # Create a temporary file to store the download
-        temp_dir = current_app.config['UPLOAD_FOLDER']
-        os.makedirs(temp_dir, exist_ok=True)
+        temp_dir = current_app.config['UPLOAD_FOLDER']  # Created at startup in app.py
         
         # Generate a unique filename
         original_filename = file_metadata['name']
@@ -423,6 +423,7 @@ def download_file(file_id):
         
         db.session.add(document)
         db.session.commit()
+        invalidate_dashboard_cache(current_user.id)
         
         # Offer a link to return to the folder view
         session['last_google_folder'] = folder_id
@@ -8,6 +8,9 @@ from typing import Dict, List, Any, Optional
 import io
 from datetime import datetime, timedelta
 
+from flask import current_app
+from werkzeug.utils import secure_filename
+
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
@@ -163,10 +166,9 @@ class GoogleDriveIntegration(CloudStorageIntegration):
             # Determine destination path
             if not destination_path:
                 # Use a temporary file in the uploads folder
-                destination_path = os.path.join('uploads', 'temp', f"{file_id}_{file_metadata['name']}")
-                
-                # Ensure the directory exists
-                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                destination_path = os.path.join(
+                    current_app.config['UPLOAD_TEMP_FOLDER'], f"{file_id}_{secure_filename(file_metadata['name'])}"
+                )
             
             # Download the file
             with open(destination_path, 'wb') as f:
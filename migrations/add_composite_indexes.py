@@ -0,0 +1,55 @@
+"""
+Migration script to add composite indexes for the per-user list and lookup queries.
+"""
+import logging
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Now we can import from the application
+from main import app
+from app import db
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+# Index name -> (table, column list)
+INDEXES = {
+    'ix_documents_user_uploaded': ('documents', 'user_id, uploaded_at DESC'),
+    'ix_documents_user_filename': ('documents', 'user_id, filename'),
+    'ix_briefs_user_generated': ('briefs', 'user_id, generated_at DESC'),
+    'ix_briefs_document': ('briefs', 'document_id'),
+    'ix_knowledge_entries_user_updated': ('knowledge_entries', 'user_id, updated_at DESC'),
+    'ix_knowledge_entries_user_created': ('knowledge_entries', 'user_id, created_at DESC'),
+    'ix_knowledge_entries_document': ('knowledge_entries', 'document_id'),
+    'ix_statutes_document_current': ('statutes', 'document_id, is_current'),
+    'ix_knowledge_tags_tag': ('knowledge_tags', 'tag_id, knowledge_entry_id'),
+}
+
+def run_migration():
+    """
+    Create the composite indexes if they don't exist.
+    """
+    try:
+        with app.app_context():
+            for index_name, (table_name, columns) in INDEXES.items():
+                logger.info(f"Creating index {index_name} on {table_name} ({columns})")
+                db.session.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})"
+                ))
+            
+            # Commit the transaction
+            db.session.commit()
+            logger.info("Migration completed successfully")
+            
+            return True, "Migration completed successfully"
+            
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        return False, f"Migration failed: {str(e)}"
+        
+if __name__ == "__main__":
+    success, message = run_migration()
+    print(message)
@@ -0,0 +1,46 @@
+"""
+Migration script to add the sha256 content hash column to the documents table.
+"""
+import logging
+import sys
+import os
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Now we can import from the application
+from main import app
+from app import db
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+def run_migration():
+    """
+    Add the sha256 column to the documents table if it doesn't exist.
+    """
+    try:
+        with app.app_context():
+            # Check if the column exists
+            inspector = db.inspect(db.engine)
+            existing_columns = [column['name'] for column in inspector.get_columns('documents')]
+            
+            logger.info(f"Existing columns in documents table: {existing_columns}")
+            
+            if 'sha256' not in existing_columns:
+                logger.info("Adding sha256 column to documents table")
+                db.session.execute(text("ALTER TABLE documents ADD COLUMN sha256 VARCHAR(64)"))
+            
+            # Commit the transaction
+            db.session.commit()
+            logger.info("Migration completed successfully")
+            
+            return True, "Migration completed successfully"
+            
+    except Exception as e:
+        logger.error(f"Error during migration: {str(e)}")
+        return False, f"Migration failed: {str(e)}"
+        
+if __name__ == "__main__":
+    success, message = run_migration()
+    print(message)
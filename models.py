@@ -1,8 +1,45 @@
+import os
 import datetime
+import logging
+from functools import lru_cache
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 
+logger = logging.getLogger(__name__)
+
+# Argon2id hashes new passwords when argon2-cffi is installed; werkzeug hashes stay verifiable
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+    _argon2_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
+except ImportError:
+    _argon2_hasher = None
+
+# Werkzeug method used without argon2, e.g. "scrypt:16384:8:1" or "pbkdf2:sha256:260000" to tune login cost
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+
+def _hash_password(password):
+    if _argon2_hasher is not None:
+        return _argon2_hasher.hash(password)
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+def _verify_password(password_hash, password):
+    if password_hash.startswith('$argon2'):
+        if _argon2_hasher is None:
+            logger.error("Cannot verify an argon2 password hash: argon2-cffi is not installed")
+            return False
+        try:
+            return _argon2_hasher.verify(password_hash, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(password_hash, password)
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash():
+    # Hashed once, then compared against when no account matches the login
+    return _hash_password('not-a-real-password')
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -22,10 +59,28 @@ class User(UserMixin, db.Model):
     onboarding_progress = db.relationship('OnboardingProgress', backref='user', uselist=False, lazy='joined', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _hash_password(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return _verify_password(self.password_hash, password)
+    
+    @staticmethod
+    def verify_login(user, password):
+        """
+        Check a login password, spending the same hashing time when the user doesn't exist.
+
+        Args:
+            user (User): The user looked up by email, or None
+            password (str): The submitted password
+
+        Returns:
+            bool: True if the user exists and the password matches
+        """
+        if user is None:
+            # Unknown emails must not answer faster than wrong passwords
+            _verify_password(_dummy_password_hash(), password)
+            return False
+        return user.check_password(password)
     
     def __repr__(self):
         return f'<User {self.username}>'
@@ -36,6 +91,11 @@ class User(UserMixin, db.Model):
         self.api_key = secrets.token_hex(16)  # 32 character hex string
         return self.api_key
 
+# Analysis stages a queued document moves through before ending in 'done' or 'failed'
+DOCUMENT_ACTIVE_STATES = ('queued', 'parsing', 'analyzing', 'extracting_statutes')
+# Knowledge extraction states during which another extraction is not queued
+KNOWLEDGE_EXTRACTION_ACTIVE_STATES = ('queued', 'extracting')
+
 class Document(db.Model):
     __tablename__ = 'documents'
     
@@ -44,18 +104,32 @@ class Document(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(512), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)  # Size in bytes
+    sha256 = db.Column(db.String(64), nullable=True)  # Hex digest of the uploaded bytes
     content_type = db.Column(db.String(100), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     processed = db.Column(db.Boolean, default=False)
     processing_error = db.Column(db.Text, nullable=True)
+    processing_state = db.Column(db.String(32), nullable=True)  # Current analysis stage, see DOCUMENT_ACTIVE_STATES
+    knowledge_extraction_state = db.Column(db.String(32), nullable=True)  # queued, extracting, done or failed
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
-    # Relationships
-    briefs = db.relationship('Brief', backref='document', lazy='dynamic')
-    statutes = db.relationship('Statute', backref='document', lazy='dynamic')
-    knowledge_entries = db.relationship('KnowledgeEntry', backref='source_document', lazy='dynamic')
+    # Relationships (briefs and statutes must be eager-loaded with selectinload; an accidental
+    # lazy load raises. They are removed by the database's ON DELETE CASCADE when the document is deleted)
+    briefs = db.relationship('Brief', back_populates='document', lazy='raise',
+                             cascade='all, delete-orphan', passive_deletes=True)
+    statutes = db.relationship('Statute', back_populates='document', lazy='raise',
+                               cascade='all, delete-orphan', passive_deletes=True)
+    # The database sets knowledge_entries.document_id to NULL when the document is deleted
+    knowledge_entries = db.relationship('KnowledgeEntry', backref='source_document', lazy='dynamic',
+                                        passive_deletes=True)
+    
+    # Composite indexes for the per-user listing (newest first) and download lookups
+    __table_args__ = (
+        db.Index('ix_documents_user_uploaded', user_id, uploaded_at.desc()),
+        db.Index('ix_documents_user_filename', user_id, filename),
+    )
     
     def __repr__(self):
         return f'<Document {self.original_filename}>'
@@ -73,9 +147,19 @@ class Brief(db.Model):
     generated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     
     # Foreign Keys
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
+    # Relationships
+    document = db.relationship('Document', back_populates='briefs')
+    
+    # Composite index for the per-user listing (newest first); document_id is indexed for
+    # the document page's brief load and the ON DELETE CASCADE from documents
+    __table_args__ = (
+        db.Index('ix_briefs_user_generated', user_id, generated_at.desc()),
+        db.Index('ix_briefs_document', document_id),
+    )
+    
     def __repr__(self):
         return f'<Brief {self.title}>'
 
@@ -90,7 +174,14 @@ class Statute(db.Model):
     source_database = db.Column(db.String(255), nullable=True)  # Which law database was used
     
     # Foreign Keys
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False)
+    
+    # Relationships
+    document = db.relationship('Document', back_populates='statutes')
+    
+    __table_args__ = (
+        db.Index('ix_statutes_document_current', document_id, is_current),
+    )
     
     def __repr__(self):
         return f'<Statute {self.reference}>'
@@ -109,13 +200,24 @@ class KnowledgeEntry(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     is_verified = db.Column(db.Boolean, default=False)
     
+    # Leading slice of content, filled in only by queries that ask for it with with_expression()
+    content_preview = db.query_expression()
+    
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=True)  # Optional link to a document
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='SET NULL'), nullable=True)  # Optional link to a document
     
     # Relationships
     tags = db.relationship('Tag', secondary='knowledge_tags', backref=db.backref('entries', lazy='dynamic'))
-    references = db.relationship('Reference', backref='entry', lazy='dynamic')
+    references = db.relationship('Reference', backref='entry', lazy='dynamic',
+                                 cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        db.Index('ix_knowledge_entries_user_updated', user_id, updated_at.desc()),
+        db.Index('ix_knowledge_entries_user_created', user_id, created_at.desc()),
+        # Lets the ON DELETE SET NULL from documents find linked entries without a table scan
+        db.Index('ix_knowledge_entries_document', document_id),
+    )
     
     def __repr__(self):
         return f'<KnowledgeEntry {self.title}>'
@@ -137,7 +239,9 @@ class Tag(db.Model):
 # Association table for many-to-many relationship between KnowledgeEntry and Tag
 knowledge_tags = db.Table('knowledge_tags',
     db.Column('knowledge_entry_id', db.Integer, db.ForeignKey('knowledge_entries.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id'), primary_key=True),
+    # The primary key leads with knowledge_entry_id, so tag -> entries lookups need their own index
+    db.Index('ix_knowledge_tags_tag', 'tag_id', 'knowledge_entry_id')
 )
 
 class Reference(db.Model):
@@ -152,7 +256,7 @@ class Reference(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     
     # Foreign Keys
-    knowledge_entry_id = db.Column(db.Integer, db.ForeignKey('knowledge_entries.id'), nullable=False)
+    knowledge_entry_id = db.Column(db.Integer, db.ForeignKey('knowledge_entries.id', ondelete='CASCADE'), nullable=False)
     
     def __repr__(self):
         return f'<Reference {self.reference_type}:{self.reference_id}>'
@@ -191,7 +295,7 @@ class OnboardingProgress(db.Model):
     
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
-    tutorial_document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=True)
+    tutorial_document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='SET NULL'), nullable=True)
     
     def __repr__(self):
         return f'<OnboardingProgress user_id={self.user_id} step={self.current_step}>'
@@ -5,6 +5,7 @@ This module initializes all the plugin packages for third-party integrations.
 import os
 import importlib
 import logging
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -83,9 +84,16 @@ def get_plugin_info():
     """
     Get information about all available plugins.
     
+    The plugin directories are scanned and imported once per process, since
+    they only change on deploy; each call returns fresh copies of the manifests.
+    
     Returns:
         list: List of dictionaries containing plugin information
     """
+    return [dict(info) for info in _load_plugin_info()]
+
+@lru_cache(maxsize=None)
+def _load_plugin_info():
     plugin_info = []
     plugin_dirs = get_plugin_directories()
     
@@ -112,4 +120,4 @@ def get_plugin_info():
         except Exception as e:
             logger.error(f"Failed to get plugin info for {plugin_name}: {str(e)}")
             
-    return plugin_info
\ No newline at end of file
+    return tuple(plugin_info)
\ No newline at end of file
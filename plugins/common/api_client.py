@@ -3,6 +3,7 @@ API client for Legal Document Analyzer plugins.
 """
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from plugins.common.utils import logger
 
@@ -20,6 +21,11 @@ class APIClient:
         self.api_url = api_url.rstrip('/')
         self.api_key = api_key
         self.session = requests.Session()
+        
+        # Keep connections alive across calls so repeated uploads skip the TCP/TLS handshake
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'X-API-Key': api_key,
             'Content-Type': 'application/json',
@@ -72,15 +78,11 @@ class APIClient:
         url = f"{self.api_url}/{endpoint.lstrip('/')}"
         logger.info(f"POST {url}")
         
-        headers = {}
-        if files:
-            # Remove Content-Type header when uploading files
-            headers = {'X-API-Key': self.api_key}
-        
         response = None
         try:
             if files:
-                response = requests.post(url, data=data, files=files, headers=headers)
+                # Drop the session's JSON Content-Type so requests sets the multipart boundary
+                response = self.session.post(url, data=data, files=files, headers={'Content-Type': None})
             else:
                 response = self.session.post(url, json=data)
             
@@ -174,6 +176,28 @@ class APIClient:
             files = {'file': (os.path.basename(file_path), f)}
             return self.post('api/integrations/upload', files=files)
     
+    def upload_document_bytes(self, document_content, filename='document.txt'):
+        """
+        Upload in-memory document content to the API without a temporary file.
+        
+        Args:
+            document_content (str or bytes): Document content
+            filename (str, optional): Filename to report for the upload
+            
+        Returns:
+            dict: Upload response data
+        """
+        logger.info(f"Uploading document content as: {filename}")
+        
+        if isinstance(document_content, str):
+            buf = document_content.encode('utf-8')
+        else:
+            # Wrap bytes-like content so the multipart encoder reads it without copying
+            buf = memoryview(document_content)
+            
+        files = {'file': (filename, buf, 'text/plain')}
+        return self.post('api/integrations/upload', files=files)
+    
     def generate_brief(self, document_id, title=None, focus_areas=None):
         """
         Generate a brief from a document.
@@ -4,7 +4,6 @@ Google Docs plugin implementation for Legal Document Analyzer.
 import os
 import logging
 import json
-import tempfile
 from plugins.common.base_plugin import BasePlugin
 from plugins.common.api_client import APIClient
 from plugins.common.utils import load_config, save_config, format_timestamp
@@ -213,27 +212,17 @@ class GoogleDocsPlugin(BasePlugin):
         if not self.api_client:
             raise Exception("API client not initialized")
             
-        # Create temporary file with document content
-        fd, path = tempfile.mkstemp(suffix='.txt')
-        try:
-            with os.fdopen(fd, 'wb') as f:
-                if isinstance(document_content, str):
-                    document_content = document_content.encode('utf-8')
-                f.write(document_content)
-            
-            # Upload document
-            response = self.api_client.upload_document(path)
-            
-            # Return analysis results
-            return {
-                'document_id': response.get('document_id', response.get('id')),
-                'statutes_found': len(response.get('statutes', [])),
-                'statutes': response.get('statutes', []),
-                'message': response.get('message', 'Document analyzed successfully'),
-                'timestamp': format_timestamp()
-            }
-        finally:
-            os.unlink(path)
+        # Upload the content straight from memory
+        response = self.api_client.upload_document_bytes(document_content)
+        
+        # Return analysis results
+        return {
+            'document_id': response.get('document_id', response.get('id')),
+            'statutes_found': len(response.get('statutes', [])),
+            'statutes': response.get('statutes', []),
+            'message': response.get('message', 'Document analyzed successfully'),
+            'timestamp': format_timestamp()
+        }
             
     def generate_brief(self, document_id, title=None, focus_areas=None):
         """
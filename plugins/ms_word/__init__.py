@@ -117,6 +117,34 @@ class MSWordPlugin(BasePlugin):
             logging.error(f"Error exporting add-in files: {str(e)}")
             return False
     
+    def export_add_in_archive(self, zipf):
+        """
+        Write the add-in files straight into an open zip archive.
+        
+        Args:
+            zipf (zipfile.ZipFile): Archive opened for writing
+            
+        Returns:
+            bool: True if files were exported successfully, False otherwise
+        """
+        import os
+        
+        try:
+            zipf.writestr('manifest.xml', self._get_manifest_template())
+            
+            # Same layout as export_add_in_files: assets/ relative to the archive root
+            plugin_dir = os.path.dirname(__file__)
+            for root, dirs, files in os.walk(os.path.join(plugin_dir, 'assets')):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, os.path.relpath(file_path, plugin_dir))
+            
+            return True
+        except Exception as e:
+            import logging
+            logging.error(f"Error exporting add-in archive: {str(e)}")
+            return False
+    
     def _get_manifest_template(self):
         """
         Get the Microsoft Office Add-in manifest template.
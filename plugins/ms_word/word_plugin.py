@@ -5,12 +5,38 @@ import os
 import logging
 import json
 import shutil
+from jinja2 import Template
 from plugins.common.base_plugin import BasePlugin
 from plugins.common.api_client import APIClient
 from plugins.common.utils import load_config, save_config, format_timestamp
 
 logger = logging.getLogger(__name__)
 
+# Statute table compiled once at import; autoescape guards the interpolated API values
+_CELL_STYLE = "padding: 8px; text-align: left; border: 1px solid #ddd;"
+_STATUTE_TABLE = Template(
+    "<h2>Statute References</h2>"
+    "<table style='width: 100%; border-collapse: collapse;'>"
+    "<tr style='background-color: #f2f2f2;'>"
+    "<th style='{{ cell }}'>Reference</th>"
+    "<th style='{{ cell }}'>Status</th>"
+    "<th style='{{ cell }}'>Source</th>"
+    "<th style='{{ cell }}'>Verified</th>"
+    "</tr>"
+    "{% for statute in statutes %}"
+    "{% set current = statute.get('is_current', True) %}"
+    "<tr>"
+    "<td style='{{ cell }}'>{{ statute['reference'] }}</td>"
+    "<td style='{{ cell }} color: {{ '#198754' if current else '#dc3545' }};'>"
+    "{{ 'Current' if current else 'Outdated' }}</td>"
+    "<td style='{{ cell }}'>{{ statute.get('source_database', 'Unknown') }}</td>"
+    "<td style='{{ cell }}'>{{ statute.get('verified_at', 'Unknown') }}</td>"
+    "</tr>"
+    "{% endfor %}"
+    "</table>",
+    autoescape=True
+)
+
 class MSWordPlugin(BasePlugin):
     """
     Microsoft Word plugin implementation.
@@ -156,27 +182,16 @@ class MSWordPlugin(BasePlugin):
         if not self.api_client:
             raise Exception("API client not initialized")
             
-        # Create temporary file with document content
-        import tempfile
-        fd, path = tempfile.mkstemp(suffix='.txt')
-        try:
-            with os.fdopen(fd, 'wb') as f:
-                if isinstance(document_content, str):
-                    document_content = document_content.encode('utf-8')
-                f.write(document_content)
-            
-            # Upload document
-            response = self.api_client.upload_document(path)
-            
-            # Return analysis results
-            return {
-                'document_id': response.get('id'),
-                'statutes_found': response.get('statutes_found', 0),
-                'message': response.get('message', 'Document analyzed successfully'),
-                'timestamp': format_timestamp()
-            }
-        finally:
-            os.unlink(path)
+        # Upload the content straight from memory
+        response = self.api_client.upload_document_bytes(document_content)
+        
+        # Return analysis results
+        return {
+            'document_id': response.get('id'),
+            'statutes_found': response.get('statutes_found', 0),
+            'message': response.get('message', 'Document analyzed successfully'),
+            'timestamp': format_timestamp()
+        }
             
     def generate_brief(self, document_id, title=None, focus_areas=None):
         """
@@ -248,26 +263,7 @@ class MSWordPlugin(BasePlugin):
             lines.append(f"<p>Document ID: {analysis_results['document_id']}</p>")
             
         if 'statutes' in analysis_results:
-            lines.append("<h2>Statute References</h2>")
-            lines.append("<table style='width: 100%; border-collapse: collapse;'>")
-            lines.append("<tr style='background-color: #f2f2f2;'>")
-            lines.append("<th style='padding: 8px; text-align: left; border: 1px solid #ddd;'>Reference</th>")
-            lines.append("<th style='padding: 8px; text-align: left; border: 1px solid #ddd;'>Status</th>")
-            lines.append("<th style='padding: 8px; text-align: left; border: 1px solid #ddd;'>Source</th>")
-            lines.append("<th style='padding: 8px; text-align: left; border: 1px solid #ddd;'>Verified</th>")
-            lines.append("</tr>")
-            
-            for statute in analysis_results['statutes']:
-                status = "Current" if statute.get('is_current', True) else "Outdated"
-                color = "#198754" if statute.get('is_current', True) else "#dc3545"
-                lines.append("<tr>")
-                lines.append(f"<td style='padding: 8px; text-align: left; border: 1px solid #ddd;'>{statute['reference']}</td>")
-                lines.append(f"<td style='padding: 8px; text-align: left; border: 1px solid #ddd; color: {color};'>{status}</td>")
-                lines.append(f"<td style='padding: 8px; text-align: left; border: 1px solid #ddd;'>{statute.get('source_database', 'Unknown')}</td>")
-                lines.append(f"<td style='padding: 8px; text-align: left; border: 1px solid #ddd;'>{statute.get('verified_at', 'Unknown')}</td>")
-                lines.append("</tr>")
-            
-            lines.append("</table>")
+            lines.append(_STATUTE_TABLE.render(statutes=analysis_results['statutes'], cell=_CELL_STYLE))
                 
         # Return HTML
         return "".join(lines)
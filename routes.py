@@ -1,14 +1,17 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, send_from_directory, abort
+from flask import render_template, redirect, url_for, flash, request, jsonify, send_from_directory, send_file, abort, make_response
 from flask_login import login_required, current_user, login_user, logout_user
 import os
 from app import db
-from models import User, Document, Brief, Statute, KnowledgeEntry, Tag, Reference
+from models import User, OnboardingProgress, Document, Brief, Statute, KnowledgeEntry, Tag, Reference, knowledge_tags as entry_tags, DOCUMENT_ACTIVE_STATES, KNOWLEDGE_EXTRACTION_ACTIVE_STATES
 from services.document_parser import is_allowed_file
+from services.upload_service import (
+    streaming_upload_available, receive_streamed_upload, save_file_storage, unique_upload_filename, UploadRejected
+)
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 import logging
-from forms import LoginForm, RegistrationForm
-from datetime import datetime
+import traceback
+from forms import LoginForm, RegistrationForm, UploadForm, ApiKeyForm, KnowledgeEntryForm
 from services.brief_generator import generate_brief as brief_generator_service
 from services.knowledge_service import (
     create_knowledge_entry, 
@@ -16,20 +19,123 @@ from services.knowledge_service import (
     get_knowledge_entry, 
     update_knowledge_entry, 
     delete_knowledge_entry, 
-    extract_knowledge_from_document,
-    get_trending_tags
+    get_trending_tags,
+    get_all_tags,
+    get_or_create_tags,
+    invalidate_tag_cache
 )
-from services.onboarding_service import OnboardingService
+from services.onboarding_service import OnboardingService, FINAL_STEP
 from forms import CSRFDisabledForm
 import urllib.parse
+import unicodedata
+from functools import lru_cache
+from sqlalchemy import select, bindparam, delete, func
+from sqlalchemy.orm import selectinload, joinedload, lazyload, load_only, with_expression
+from services.dashboard_service import get_dashboard_data, invalidate_dashboard_cache
+from services.user_cache import invalidate_cached_user
+from services.tasks import process_document, extract_document_knowledge, remove_files
+from services.pagination import keyset_paginate, OffsetPage
+from plugins import get_plugin_info
+from services.plugin_packages import get_plugin_package, PLUGIN_DOWNLOAD_NAMES, PLUGIN_DOWNLOAD_MAX_AGE
 
 logger = logging.getLogger(__name__)
 
+# Statements for the hot per-request lookups, built once at import. SQLAlchemy's
+# compiled cache then reuses their SQL instead of rebuilding query objects per request.
+# The login check only needs the password hash, so the joined onboarding progress is deferred
+SELECT_USER_BY_EMAIL = select(User).where(User.email == bindparam('email')).options(lazyload(User.onboarding_progress))
+SELECT_USER_DOCUMENT = select(Document).where(
+    Document.id == bindparam('document_id'),
+    Document.user_id == bindparam('user_id')
+)
+SELECT_USER_DOCUMENT_DETAIL = SELECT_USER_DOCUMENT.options(
+    # The detail page lists briefs by title and summary; their full content stays unloaded
+    selectinload(Document.briefs).load_only(Brief.title, Brief.summary, Brief.generated_at),
+    selectinload(Document.statutes)
+)
+SELECT_USER_DOCUMENT_BY_FILENAME = select(Document).where(
+    Document.filename == bindparam('filename'),
+    Document.user_id == bindparam('user_id')
+)
+SELECT_USER_BRIEF = select(Brief).where(
+    Brief.id == bindparam('brief_id'),
+    Brief.user_id == bindparam('user_id')
+)
+SELECT_USER_BRIEF_DETAIL = SELECT_USER_BRIEF.options(
+    # The source document card and its statute list load with the brief
+    joinedload(Brief.document).options(
+        load_only(Document.original_filename, Document.uploaded_at, Document.file_size),
+        selectinload(Document.statutes).load_only(Statute.reference, Statute.is_current)
+    )
+)
+
+# Columns the list views render; large text columns (brief content and summaries) stay unloaded
+DOCUMENT_LIST_COLUMNS = load_only(
+    Document.filename, Document.original_filename, Document.file_size,
+    Document.uploaded_at, Document.processed, Document.processing_error
+)
+BRIEF_LIST_OPTIONS = (
+    load_only(Brief.title, Brief.generated_at, Brief.document_id),
+    joinedload(Brief.document).load_only(Document.original_filename),
+)
+# Entries without a summary show the start of their content, so only that slice is selected
+KNOWLEDGE_LIST_OPTIONS = (
+    load_only(
+        KnowledgeEntry.title, KnowledgeEntry.summary, KnowledgeEntry.source_type,
+        KnowledgeEntry.is_verified, KnowledgeEntry.updated_at
+    ),
+    with_expression(KnowledgeEntry.content_preview, func.substr(KnowledgeEntry.content, 1, 300)),
+    selectinload(KnowledgeEntry.tags),
+)
+
+def get_user_document_or_404(document_id, user_id, statement=SELECT_USER_DOCUMENT):
+    """Load a document owned by the given user or abort with a 404."""
+    document = db.session.execute(
+        statement, {'document_id': document_id, 'user_id': user_id}
+    ).scalar_one_or_none()
+    if document is None:
+        abort(404)
+    return document
+
+def get_user_brief_or_404(brief_id, user_id, statement=SELECT_USER_BRIEF):
+    """Load a brief owned by the given user or abort with a 404."""
+    brief = db.session.execute(
+        statement, {'brief_id': brief_id, 'user_id': user_id}
+    ).scalar_one_or_none()
+    if brief is None:
+        abort(404)
+    return brief
+
+def content_disposition_filename(download_name):
+    """Build Content-Disposition filename parameters, adding an RFC 2231 form for non-ASCII names."""
+    try:
+        download_name.encode('ascii')
+        return {'filename': download_name}
+    except UnicodeEncodeError:
+        ascii_name = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        return {
+            'filename': ascii_name,
+            'filename*': "UTF-8''" + urllib.parse.quote(download_name, safe="!#$&+^`|")
+        }
+
+def revalidated_page(body):
+    """
+    Wrap a rendered page in an ETag response that browsers revalidate instead of re-downloading.
+
+    The pages share the per-user layout (navigation, flashed messages), so they are
+    marked private and must be revalidated; an unchanged page is answered with 304.
+    """
+    response = make_response(body)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    response.add_etag()
+    return response.make_conditional(request)
+
 def setup_web_routes(app):
     @app.route('/')
     def index():
         """Render the home page."""
-        return render_template('index.html')
+        return revalidated_page(render_template('index.html'))
         
     @app.route('/login', methods=['GET', 'POST'])
     def web_login():
@@ -39,9 +145,9 @@ def setup_web_routes(app):
             
         form = LoginForm()
         if request.method == 'POST' and form.validate():
-            user = User.query.filter_by(email=form.email.data).first()
+            user = db.session.execute(SELECT_USER_BY_EMAIL, {'email': form.email.data}).scalar_one_or_none()
             
-            if user and user.check_password(form.password.data):
+            if User.verify_login(user, form.password.data):
                 login_user(user, remember=form.remember.data)
                 next_page = request.args.get('next')
                 return redirect(next_page or url_for('dashboard'))
@@ -53,16 +159,15 @@ def setup_web_routes(app):
     @app.route('/register', methods=['GET', 'POST'])
     def web_register():
         """Handle user registration."""
-        from app import db  # Import db at the beginning
-        
         if current_user.is_authenticated:
             return redirect(url_for('dashboard'))
         
         form = RegistrationForm()
         if request.method == 'POST' and form.validate():
-            # Create new user
+            # Create new user, with the onboarding progress row inserted in the same commit
             user = User(username=form.username.data, email=form.email.data)
             user.set_password(form.password.data)
+            user.onboarding_progress = OnboardingProgress(current_step=1)
             
             db.session.add(user)
             db.session.commit()
@@ -84,48 +189,64 @@ def setup_web_routes(app):
     @login_required
     def dashboard():
         """Render the user dashboard."""
-        recent_documents = Document.query.filter_by(user_id=current_user.id).order_by(Document.uploaded_at.desc()).limit(5)
-        recent_briefs = Brief.query.filter_by(user_id=current_user.id).order_by(Brief.generated_at.desc()).limit(5)
-        recent_knowledge = KnowledgeEntry.query.filter_by(user_id=current_user.id).order_by(KnowledgeEntry.created_at.desc()).limit(5)
-        
-        stats = {
-            'document_count': Document.query.filter_by(user_id=current_user.id).count(),
-            'brief_count': Brief.query.filter_by(user_id=current_user.id).count(),
-            'knowledge_count': KnowledgeEntry.query.filter_by(user_id=current_user.id).count(),
-            'outdated_statutes': Statute.query.join(Document).filter(
-                Document.user_id == current_user.id,
-                Statute.is_current == False
-            ).count()
-        }
+        # Stats and recent lists are cached per user and invalidated on writes
+        dashboard_data = get_dashboard_data(current_user.id)
         
         return render_template('dashboard.html', 
-                              recent_documents=recent_documents, 
-                              recent_briefs=recent_briefs,
-                              recent_knowledge=recent_knowledge,
-                              stats=stats)
+                              recent_documents=dashboard_data['recent_documents'], 
+                              recent_briefs=dashboard_data['recent_briefs'],
+                              recent_knowledge=dashboard_data['recent_knowledge'],
+                              stats=dashboard_data['stats'])
     
     @app.route('/documents', methods=['GET', 'POST'])
     @login_required
     def documents():
         """List all documents uploaded by the user."""
-        from flask_wtf.file import FileField, FileRequired, FileAllowed
-        from wtforms import SubmitField
-        from forms import CSRFDisabledForm
-        import logging
-        from app import db  # Import db at the beginning
-        
-        logger = logging.getLogger(__name__)
-        
-        class UploadForm(CSRFDisabledForm):
-                
-            file = FileField('Document', validators=[
-                FileRequired(),
-                FileAllowed(['pdf', 'doc', 'docx', 'txt', 'rtf'], 'Allowed formats: PDF, DOCX, DOC, TXT, RTF')
-            ])
-            submit = SubmitField('Upload Document')
-        
-        page = request.args.get('page', 1, type=int)
+        user_id = current_user.id
         per_page = 10
+        upload_folder = app.config['UPLOAD_FOLDER']  # Created once at startup in app.py
+        
+        def save_document_record(file_path, unique_filename, filename, content_type, file_size, sha256):
+            """Record a saved upload for the current user; txt conversion happens during analysis."""
+            # Create new document record
+            new_document = Document(
+                filename=unique_filename,
+                original_filename=filename,
+                file_path=file_path,
+                file_size=file_size,
+                sha256=sha256,  # Digest of the upload as received, even after conversion to txt
+                content_type="text/plain" if file_path.lower().endswith('.txt') else content_type,
+                user_id=user_id
+            )
+            
+            db.session.add(new_document)
+            db.session.commit()
+            invalidate_dashboard_cache(user_id)
+            
+            # Document has been saved but not processed yet
+            flash('Document uploaded successfully. Please proceed to analyze the document.', 'success')
+            return redirect(url_for('document_detail', document_id=new_document.id))
+        
+        if request.method == 'POST' and streaming_upload_available(request):
+            # Parse the multipart body incrementally so the file goes straight to disk
+            logger.info("Processing streamed document upload request")
+            try:
+                # The extension is checked from the part headers, before the file body is read
+                upload = receive_streamed_upload(request, 'file', upload_folder, accept_filename=is_allowed_file)
+            except UploadRejected:
+                flash('Invalid file type. Allowed types: PDF, DOCX, DOC, TXT, RTF', 'danger')
+                return redirect(request.url)
+            
+            if not upload:
+                flash('No file selected', 'danger')
+                return redirect(request.url)
+            
+            filename = secure_filename(upload['filename'])
+            unique_filename = unique_upload_filename(upload['filename'])
+            file_path = os.path.join(upload_folder, unique_filename)
+            os.replace(upload['path'], file_path)
+            
+            return save_document_record(file_path, unique_filename, filename, upload['content_type'], upload['size'], upload['sha256'])
         
         # Create a fresh form instance that's properly bound to the request
         form = UploadForm()
@@ -141,57 +262,21 @@ def setup_web_routes(app):
                 
             if file and is_allowed_file(file.filename):
                 filename = secure_filename(file.filename)
-                timestamp = int(datetime.now().timestamp())
-                unique_filename = f"{timestamp}_{filename}"
-                upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+                unique_filename = unique_upload_filename(file.filename)
                 file_path = os.path.join(upload_folder, unique_filename)
                 
-                # Ensure upload directory exists
-                os.makedirs(upload_folder, exist_ok=True)
-                
-                # Save the file
-                file.save(file_path)
+                # Save the file, taking its size and hash from the same write
+                file_size, sha256 = save_file_storage(file, file_path)
                 
-                # If the file is not a txt file, convert it to txt format
-                original_file_path = file_path
-                _, file_ext = os.path.splitext(file_path.lower())
-                
-                if file_ext != '.txt':
-                    logger.info(f"Converting non-txt file to txt format: {file_path}")
-                    from services.document_parser import document_parser
-                    txt_file_path = document_parser.convert_to_txt(file_path)
-                    
-                    if txt_file_path and os.path.exists(txt_file_path):
-                        # Use the txt file as the primary file
-                        file_path = txt_file_path
-                        unique_filename = os.path.basename(txt_file_path)
-                        logger.info(f"Successfully converted to txt file: {txt_file_path}")
-                    else:
-                        logger.warning(f"Failed to convert to txt format, using original file: {file_path}")
-                
-                # Create new document record
-                new_document = Document(
-                    filename=unique_filename,
-                    original_filename=filename,
-                    file_path=file_path,
-                    file_size=os.path.getsize(file_path),
-                    content_type="text/plain" if file_path.lower().endswith('.txt') else file.content_type,
-                    user_id=current_user.id
-                )
-                
-                db.session.add(new_document)
-                db.session.commit()
-                
-                # Document has been saved but not processed yet
-                flash('Document uploaded successfully. Please proceed to analyze the document.', 'success')
-                return redirect(url_for('document_detail', document_id=new_document.id))
+                return save_document_record(file_path, unique_filename, filename, file.content_type, file_size, sha256)
             else:
                 flash('Invalid file type. Allowed types: PDF, DOCX, DOC, TXT, RTF', 'danger')
                 return redirect(request.url)
         
-        documents = Document.query.filter_by(user_id=current_user.id).order_by(
-            Document.uploaded_at.desc()
-        ).paginate(page=page, per_page=per_page)
+        documents = keyset_paginate(
+            Document.query.filter_by(user_id=user_id).options(DOCUMENT_LIST_COLUMNS),
+            Document.uploaded_at, Document.id, request.args, per_page=per_page
+        )
         
         return render_template('documents.html', documents=documents, form=form)
     
@@ -199,181 +284,107 @@ def setup_web_routes(app):
     @login_required
     def document_detail(document_id):
         """Show details of a specific document."""
-        from forms import CSRFDisabledForm
-        
-        document = Document.query.filter_by(id=document_id, user_id=current_user.id).first_or_404()
-        briefs = Brief.query.filter_by(document_id=document.id).all()
-        statutes = Statute.query.filter_by(document_id=document.id).all()
+        # Load both collections with keyed IN queries instead of lazy loads (no join fan-out)
+        document = get_user_document_or_404(document_id, current_user.id, SELECT_USER_DOCUMENT_DETAIL)
         
         # Create a simple form without CSRF
         form = CSRFDisabledForm()
         
         return render_template('document_detail.html', 
                               document=document, 
-                              briefs=briefs,
-                              statutes=statutes,
+                              briefs=document.briefs,
+                              statutes=document.statutes,
+                              analysis_active=document.processing_state in DOCUMENT_ACTIVE_STATES,
                               form=form)
                               
     @app.route('/documents/<int:document_id>/analyze', methods=['POST'])
     @login_required
     def analyze_document_route(document_id):
-        """Analyze a document that has been uploaded but not processed."""
-        import traceback
-        from services.document_parser import document_parser
-        from app import db  # Import db at the beginning
-        
-        logger = logging.getLogger(__name__)
-        
-        document = Document.query.filter_by(id=document_id, user_id=current_user.id).first_or_404()
+        """Queue analysis of a document that has been uploaded but not processed."""
+        document = get_user_document_or_404(document_id, current_user.id)
         
         # Don't re-process if already processed
         if document.processed:
             flash('Document has already been analyzed', 'info')
             return redirect(url_for('document_detail', document_id=document.id))
         
-        try:
-            # Step 1: Parse the document to extract text
-            logger.info(f"Starting document parsing for {document.file_path}")
-            try:
-                document_text = document_parser.parse_document(document.file_path)
-                logger.info(f"Document parsed successfully, text length: {len(document_text)}")
-                
-                # Store just the first 10,000 characters to prevent memory issues in subsequent steps
-                # This will be used for analysis instead of the full text
-                parsed_text = document_text[:10000] if len(document_text) > 10000 else document_text
-            except Exception as parse_error:
-                logger.error(f"Error parsing document: {str(parse_error)}")
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                raise parse_error
-            
-            # Step 2: Basic document analysis 
-            logger.info(f"Starting document analysis for document ID: {document.id}")
-            try:
-                from services.text_analysis import TextAnalyzer
-                
-                # Use the analyzer directly instead of the analyze_document function to have more control
-                analyzer = TextAnalyzer()
-                results = analyzer.analyze_text_with_nlp(parsed_text)
-                
-                logger.info(f"Basic document analysis completed")
-                
-                # No need to store these results in the database yet
-            except Exception as analysis_error:
-                logger.error(f"Error in basic text analysis: {str(analysis_error)}")
-                logger.error(f"Traceback: {traceback.format_exc()}")
-                # Continue even if this fails
-            
-            # Step 3: Extract statutes (with full text for better detection)
-            statute_count = 0
-            try:
-                logger.info(f"Starting statute extraction with OpenAI")
-                from services.openai_document import analyze_document_for_statutes
-                
-                # Try to analyze the entire document text for better context, but limit if too large
-                max_statute_text_length = 5000  # Increased from what we had before
-                if len(document_text) > max_statute_text_length:
-                    logger.info(f"Using first {max_statute_text_length} chars for statute extraction (document has {len(document_text)} chars)")
-                    statutes_text = document_text[:max_statute_text_length]
-                else:
-                    logger.info(f"Using full document text ({len(document_text)} chars) for statute extraction")
-                    statutes_text = document_text
-                
-                # Force the analysis even for small text snippets
-                statutes = analyze_document_for_statutes(statutes_text)
-                
-                # If we didn't find any statutes but we have a longer document, try another chunk
-                if (not statutes or len(statutes) == 0) and len(document_text) > max_statute_text_length + 1000:
-                    logger.info("No statutes found in first chunk, trying second chunk...")
-                    second_chunk = document_text[max_statute_text_length:max_statute_text_length+5000]
-                    more_statutes = analyze_document_for_statutes(second_chunk)
-                    if more_statutes and len(more_statutes) > 0:
-                        statutes.extend(more_statutes)
-                        logger.info(f"Found {len(more_statutes)} statutes in second chunk")
-                
-                # Store what we found (if anything)
-                if statutes and len(statutes) > 0:
-                    statute_count = len(statutes)
-                    logger.info(f"Found total of {statute_count} statutes using OpenAI analysis")
-                    
-                    # Store statutes in the database
-                    from services.text_analysis import store_statutes
-                    store_statutes(statutes, document.id)
-                else:
-                    logger.warning("No statutes found in document text")
-                    
-                    # Create at least one statute entry with placeholder text for demonstration
-                    # This ensures briefs will include a statutes section even for docs with no detected statutes
-                    if len(document_text) > 200:  # Only for reasonably sized documents
-                        from models import Statute
-                        from app import db
-                        from datetime import datetime
-                        
-                        logger.info("Creating placeholder statute reference for demo purposes")
-                        demo_statute = Statute(
-                            document_id=document.id,
-                            reference="Example: 42 U.S.C. § 1983",
-                            content="This document may not contain explicit statute references. This is an example statute citation that would appear here if detected.",
-                            is_current=True,
-                            verified_at=datetime.utcnow()
-                        )
-                        db.session.add(demo_statute)
-                        db.session.commit()
-                        statute_count = 1  # Set to 1 to indicate we have a statute (even if placeholder)
-            except Exception as e:
-                logger.warning(f"Error extracting statutes with OpenAI: {str(e)}")
-                logger.warning(f"Traceback: {traceback.format_exc()}")
-                # Continue even if this step fails
-            
-            # Step 4: Mark document as processed
-            document.processed = True
-            document.processing_error = None  # Clear any previous error
-            db.session.commit()
-            logger.info(f"Document ID {document.id} marked as processed successfully")
-            
-            flash(f'Document analyzed successfully. Found {statute_count} statutes.', 'success')
-        except Exception as e:
-            logger.error(f"Error processing document: {str(e)}")
-            document.processing_error = str(e)
-            db.session.commit()
-            flash(f'Error analyzing document: {str(e)}', 'danger')
+        if document.processing_state in DOCUMENT_ACTIVE_STATES:
+            flash('Analysis is already in progress for this document', 'info')
+            return redirect(url_for('document_detail', document_id=document.id))
         
-        return redirect(url_for('document_detail', document_id=document.id))
+        # Parsing, NLP analysis and statute extraction run on the task queue
+        document.processing_state = 'queued'
+        db.session.commit()
+        process_document.delay(document.id)
+        logger.info(f"Queued document ID {document.id} for processing")
+        
+        flash('Document queued for analysis. This page will update when processing finishes.', 'info')
+        return redirect(url_for('document_detail', document_id=document.id, queued=1))
+    
+    @app.route('/documents/<int:document_id>/status')
+    @login_required
+    def document_status(document_id):
+        """Report the processing status of a document for client-side polling."""
+        # Polled every few seconds, so only the status columns are read
+        document = db.session.execute(
+            select(
+                Document.id, Document.processed, Document.processing_error, Document.processing_state,
+                Document.knowledge_extraction_state
+            ).where(
+                Document.id == document_id, Document.user_id == current_user.id
+            )
+        ).one_or_none()
+        if document is None:
+            abort(404)
+        
+        if document.processed:
+            status = 'processed'
+        elif document.processing_error:
+            status = 'error'
+        else:
+            status = 'pending'
+            
+        return jsonify({
+            'id': document.id,
+            'status': status,
+            'state': document.processing_state,
+            'processed': document.processed,
+            'processing_error': document.processing_error,
+            'knowledge_state': document.knowledge_extraction_state
+        })
                               
     @app.route('/documents/<int:document_id>/delete', methods=['POST'])
     @login_required
     def delete_document(document_id):
         """Delete a document and its associated data."""
-        from app import db  # Import db at the beginning
-        
-        document = Document.query.filter_by(id=document_id, user_id=current_user.id).first_or_404()
-        
-        # Delete associated data first (to avoid foreign key constraints)
-        Brief.query.filter_by(document_id=document.id).delete()
-        Statute.query.filter_by(document_id=document.id).delete()
-        
-        # Try to delete the file from storage
-        try:
-            # Delete the main file
-            if os.path.exists(document.file_path):
-                os.remove(document.file_path)
-                logger.info(f"Deleted file: {document.file_path}")
-                
-            # Check if there might be an original non-txt version to clean up
-            if document.file_path.lower().endswith('.txt'):
-                # Get the original filename from the database
-                original_ext = os.path.splitext(document.original_filename)[1]
-                if original_ext.lower() != '.txt':
-                    # There might be an original file with a different extension
-                    original_path = document.file_path[:-4] + original_ext  # Replace .txt with original extension
-                    if os.path.exists(original_path):
-                        os.remove(original_path)
-                        logger.info(f"Deleted original file: {original_path}")
-        except Exception as e:
-            logger.error(f"Error deleting file: {str(e)}")
-        
-        # Delete the document record
-        db.session.delete(document)
+        user_id = current_user.id
+        # Ownership check that only reads the columns needed to clean up the stored files
+        document = db.session.execute(
+            select(Document.file_path, Document.original_filename).where(
+                Document.id == document_id, Document.user_id == user_id
+            )
+        ).one_or_none()
+        if document is None:
+            abort(404)
+        
+        # Collect the stored files before the row goes away
+        file_paths = [document.file_path]
+        if document.file_path.lower().endswith('.txt'):
+            # There might be an original non-txt version of a converted upload to clean up
+            original_ext = os.path.splitext(document.original_filename)[1]
+            if original_ext.lower() != '.txt':
+                file_paths.append(document.file_path[:-4] + original_ext)  # Replace .txt with original extension
+        
+        # One keyed DELETE: briefs and statutes cascade in the database, and knowledge
+        # entries and onboarding progress that point at the document are set to NULL
+        db.session.execute(
+            delete(Document).where(Document.id == document_id).execution_options(synchronize_session=False)
+        )
         db.session.commit()
+        invalidate_dashboard_cache(user_id)
+        
+        # Unlink the files off the request thread
+        remove_files.delay(file_paths)
         
         flash('Document deleted successfully', 'success')
         return redirect(url_for('documents'))
@@ -382,14 +393,12 @@ def setup_web_routes(app):
     @login_required
     def briefs():
         """List all briefs generated for the user."""
-        from forms import CSRFDisabledForm
-        
-        page = request.args.get('page', 1, type=int)
         per_page = 10
         
-        briefs = Brief.query.filter_by(user_id=current_user.id).order_by(
-            Brief.generated_at.desc()
-        ).paginate(page=page, per_page=per_page)
+        briefs = keyset_paginate(
+            Brief.query.filter_by(user_id=current_user.id).options(*BRIEF_LIST_OPTIONS),
+            Brief.generated_at, Brief.id, request.args, per_page=per_page
+        )
         
         # Create a form without CSRF
         form = CSRFDisabledForm()
@@ -400,14 +409,9 @@ def setup_web_routes(app):
     @login_required
     def brief_detail(brief_id):
         """Show details of a specific brief."""
-        from forms import CSRFDisabledForm
-        from models import Statute
-        
-        brief = Brief.query.filter_by(id=brief_id, user_id=current_user.id).first_or_404()
-        document = Document.query.get_or_404(brief.document_id)
-        
-        # Get all statutes for this document
-        statutes = Statute.query.filter_by(document_id=document.id).all()
+        brief = get_user_brief_or_404(brief_id, current_user.id, SELECT_USER_BRIEF_DETAIL)
+        document = brief.document
+        statutes = document.statutes
         
         # Create a form without CSRF
         form = CSRFDisabledForm()
@@ -418,13 +422,16 @@ def setup_web_routes(app):
     @login_required
     def delete_brief(brief_id):
         """Delete a brief."""
-        from app import db  # Import db at the beginning
-        
-        brief = Brief.query.filter_by(id=brief_id, user_id=current_user.id).first_or_404()
-        
-        # Delete the brief
-        db.session.delete(brief)
+        user_id = current_user.id
+        # Delete the brief with a keyed DELETE; no matching row means it isn't the user's
+        result = db.session.execute(
+            delete(Brief).where(Brief.id == brief_id, Brief.user_id == user_id)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            abort(404)
         db.session.commit()
+        invalidate_dashboard_cache(user_id)
         
         flash('Brief deleted successfully', 'success')
         return redirect(url_for('briefs'))
@@ -433,7 +440,8 @@ def setup_web_routes(app):
     @login_required
     def generate_brief(document_id):
         """Generate a legal brief from a document."""
-        document = Document.query.filter_by(id=document_id, user_id=current_user.id).first_or_404()
+        user_id = current_user.id
+        document = get_user_document_or_404(document_id, user_id)
         
         # Ensure document is processed
         if not document.processed:
@@ -443,7 +451,8 @@ def setup_web_routes(app):
         # Get form data
         title = request.form.get('title')
         focus_areas_text = request.form.get('focus_areas')
-        focus_areas = [area.strip() for area in focus_areas_text.split('\n')] if focus_areas_text else None
+        # splitlines() also handles the \r\n line endings browsers submit from textareas
+        focus_areas = [area for area in map(str.strip, focus_areas_text.splitlines()) if area] if focus_areas_text else None
         
         try:
             # Log the inputs
@@ -454,12 +463,12 @@ def setup_web_routes(app):
             # Generate brief using the brief generator service
             # Note: The parameters must match exactly what the service expects
             brief = brief_generator_service(document, title, focus_areas)
+            invalidate_dashboard_cache(user_id)
             
             flash('Brief generated successfully', 'success')
             return redirect(url_for('brief_detail', brief_id=brief.id))
             
         except Exception as e:
-            import traceback
             logger.error(f"Error generating brief: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             flash(f'Error generating brief: {str(e)}', 'danger')
@@ -469,14 +478,13 @@ def setup_web_routes(app):
     @login_required
     def api_docs():
         """Display API documentation and the user's API key."""
-        return render_template('api_docs.html', api_key=current_user.api_key)
+        # The ETag covers the embedded key, so a regenerated key is never served stale
+        return revalidated_page(render_template('api_docs.html', api_key=current_user.api_key))
     
     @app.route('/api-settings')
     @login_required
     def api_settings():
         """Display API settings and management interface."""
-        from forms import ApiKeyForm
-        
         form = ApiKeyForm()
         
         # Construct the base API URL for the application
@@ -493,6 +501,7 @@ def setup_web_routes(app):
         if not current_user.api_key:
             current_user.generate_api_key()
             db.session.commit()
+            invalidate_cached_user(current_user.id)
             flash('An API key has been automatically generated for you.', 'info')
             
         return render_template('api_settings.html', form=form, api_url=api_url)
@@ -501,11 +510,10 @@ def setup_web_routes(app):
     @login_required
     def generate_api_key():
         """Generate an API key for the current user if they don't have one."""
-        from app import db
-        
         if not current_user.api_key:
             current_user.generate_api_key()
             db.session.commit()
+            invalidate_cached_user(current_user.id)
             flash('Your API key has been generated.', 'success')
         else:
             flash('You already have an API key.', 'info')
@@ -516,10 +524,9 @@ def setup_web_routes(app):
     @login_required
     def reset_api_key():
         """Regenerate the API key for the current user."""
-        from app import db
-        
         current_user.generate_api_key()
         db.session.commit()
+        invalidate_cached_user(current_user.id)
         flash('Your API key has been reset.', 'success')
         return redirect(url_for('api_settings'))
     
@@ -528,14 +535,25 @@ def setup_web_routes(app):
     def download_file(filename):
         """Download a file from the upload folder."""
         # Security check: Make sure the file belongs to the current user
-        document = Document.query.filter_by(filename=os.path.basename(filename), user_id=current_user.id).first()
+        document = db.session.execute(
+            SELECT_USER_DOCUMENT_BY_FILENAME,
+            {'filename': os.path.basename(filename), 'user_id': current_user.id}
+        ).scalar_one_or_none()
         
         if not document:
             abort(404, description="File not found or you don't have permission to access it.")
             
-        upload_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+        # Behind nginx, hand the transfer to an internal location mapped onto the upload folder
+        accel_prefix = app.config.get('X_ACCEL_REDIRECT_PREFIX')
+        if accel_prefix:
+            response = app.response_class(mimetype=document.content_type)
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + urllib.parse.quote(document.filename)
+            response.headers.set('Content-Disposition', 'attachment', **content_disposition_filename(document.original_filename))
+            return response
+        
+        # With USE_X_SENDFILE enabled, send_from_directory emits an X-Sendfile header instead of the body
         return send_from_directory(
-            directory=upload_folder, 
+            directory=app.config['UPLOAD_FOLDER'],
             path=filename,
             as_attachment=True,
             download_name=document.original_filename
@@ -543,62 +561,61 @@ def setup_web_routes(app):
     
     @app.errorhandler(404)
     def page_not_found(e):
-        return render_template('404.html'), 404
+        response = make_response(render_template('404.html'), 404)
+        # Never reused: the page may exist moments later, and the per-user layout carries flashed messages
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     
     @app.errorhandler(500)
     def server_error(e):
-        return render_template('500.html'), 500
+        response = make_response(render_template('500.html'), 500)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
         
     @app.route('/integrations')
     @login_required
     def integrations():
         """Show available third-party integrations."""
         # This simply renders the UI template without requiring any of the integration libraries
-        return render_template('integrations.html')
+        return revalidated_page(render_template('integrations.html'))
     
     # KnowledgeVault Routes
     @app.route('/knowledge')
     @login_required
     def knowledge_list():
         """List all knowledge entries with search functionality."""
-        from forms import KnowledgeSearchForm
-        
+        user_id = current_user.id
         # Get query parameters
         page = request.args.get('page', 1, type=int)
         per_page = 10
         query = request.args.get('q', '')
         tag_filter = request.args.get('tags', '').split(',') if request.args.get('tags') else None
         
-        # Create search form
-        form = KnowledgeSearchForm()
-        
-        # Get all available tags for the dropdown
-        all_tags = Tag.query.all()
-        form.tags.choices = [(tag.name, tag.name) for tag in all_tags]
+        # The search form is plain HTML; its tag dropdown is filled from the cached tag list
+        all_tags = get_all_tags()
         
         # Get trending tags
         trending_tags = get_trending_tags(limit=10)
         
         # Perform search if query exists
         if query or tag_filter:
-            search_results = search_knowledge(query, current_user.id, tag_filter, limit=per_page, offset=(page-1)*per_page)
-            entries = search_results['entries']
-            total = search_results['total']
-            
-            # Create pagination object manually
-            from flask_sqlalchemy import Pagination
-            pagination = Pagination(query=None, page=page, per_page=per_page, 
-                                   total=total, items=entries)
+            # Searches are offset-paginated; the service already counts matches for the search log
+            search_results = search_knowledge(
+                query, user_id, tag_filter, limit=per_page, offset=(page-1)*per_page,
+                options=KNOWLEDGE_LIST_OPTIONS
+            )
+            pagination = OffsetPage(search_results['entries'], page, per_page, search_results['total'])
         else:
-            # Just get all entries with pagination
-            pagination = KnowledgeEntry.query.filter_by(user_id=current_user.id).order_by(
-                KnowledgeEntry.updated_at.desc()
-            ).paginate(page=page, per_page=per_page)
+            # Browsing is keyset-paginated, newest first, without counting the user's entries
+            pagination = keyset_paginate(
+                KnowledgeEntry.query.filter_by(user_id=user_id).options(*KNOWLEDGE_LIST_OPTIONS),
+                KnowledgeEntry.updated_at, KnowledgeEntry.id, request.args, per_page=per_page
+            )
         
         return render_template('knowledge/list.html', 
                               entries=pagination.items, 
                               pagination=pagination,
-                              form=form,
+                              all_tags=all_tags,
                               trending_tags=trending_tags,
                               query=query)
     
@@ -606,39 +623,33 @@ def setup_web_routes(app):
     @login_required
     def knowledge_create():
         """Create a new knowledge entry."""
-        from forms import KnowledgeEntryForm
-        from app import db  # Import db at the beginning
-        
+        user_id = current_user.id
         form = KnowledgeEntryForm()
         
         if request.method == 'POST' and form.validate():
             # Process tags
             tag_names = []
             if form.tags.data:
-                tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
+                tag_names = [tag for tag in map(str.strip, form.tags.data.split(',')) if tag]
             
             # Create the knowledge entry
             try:
                 entry = create_knowledge_entry(
                     title=form.title.data,
                     content=form.content.data,
-                    user_id=current_user.id,
+                    user_id=user_id,
                     source_type=form.source_type.data,
                     is_verified=form.is_verified.data
                 )
                 
                 # Add tags if they don't already exist from auto-tagging
-                for tag_name in tag_names:
-                    tag = Tag.query.filter_by(name=tag_name.lower()).first()
-                    if not tag:
-                        tag = Tag(name=tag_name.lower(), user_id=current_user.id)
-                        db.session.add(tag)
-                        db.session.flush()
-                    
+                for tag in get_or_create_tags(tag_names, user_id):
                     if tag not in entry.tags:
                         entry.tags.append(tag)
                 
                 db.session.commit()
+                invalidate_dashboard_cache(user_id)
+                invalidate_tag_cache()
                 
                 flash('Knowledge entry created successfully', 'success')
                 return redirect(url_for('knowledge_detail', entry_id=entry.id))
@@ -653,20 +664,29 @@ def setup_web_routes(app):
     @login_required
     def knowledge_detail(entry_id):
         """Show details of a specific knowledge entry."""
-        entry = KnowledgeEntry.query.filter_by(id=entry_id).first_or_404()
-        
-        # Get related document if available
-        document = None
-        if entry.document_id:
-            document = Document.query.get(entry.document_id)
-        
-        # Get related entries based on tags
+        # The linked document is joined in with only the columns the sidebar shows
+        entry = KnowledgeEntry.query.options(
+            selectinload(KnowledgeEntry.tags),
+            joinedload(KnowledgeEntry.source_document).load_only(
+                Document.filename, Document.original_filename, Document.uploaded_at
+            )
+        ).filter_by(id=entry_id).first_or_404()
+        document = entry.source_document
+        
+        # Get related entries based on tags, with their tags loaded in one extra query.
+        # The tag ids are already loaded; the IN subquery probes ix_knowledge_tags_tag
+        # instead of running a correlated EXISTS per candidate entry.
         related_entries = []
         if entry.tags:
             tag_ids = [tag.id for tag in entry.tags]
-            related_entries = KnowledgeEntry.query.filter(
+            related_entries = KnowledgeEntry.query.options(
+                load_only(KnowledgeEntry.title),
+                selectinload(KnowledgeEntry.tags)
+            ).filter(
                 KnowledgeEntry.id != entry_id,
-                KnowledgeEntry.tags.any(Tag.id.in_(tag_ids))
+                KnowledgeEntry.id.in_(
+                    select(entry_tags.c.knowledge_entry_id).where(entry_tags.c.tag_id.in_(tag_ids))
+                )
             ).limit(5).all()
         
         return render_template('knowledge/detail.html', 
@@ -678,9 +698,6 @@ def setup_web_routes(app):
     @login_required
     def knowledge_edit(entry_id):
         """Edit a knowledge entry."""
-        from forms import KnowledgeEntryForm
-        from app import db  # Import db at the beginning
-        
         entry = KnowledgeEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
         
         form = KnowledgeEntryForm(obj=entry)
@@ -693,7 +710,7 @@ def setup_web_routes(app):
             # Process tags
             tag_names = []
             if form.tags.data:
-                tag_names = [tag.strip() for tag in form.tags.data.split(',') if tag.strip()]
+                tag_names = [tag for tag in map(str.strip, form.tags.data.split(',')) if tag]
             
             # Update the entry
             try:
@@ -708,6 +725,7 @@ def setup_web_routes(app):
                 # Also update the source type which isn't handled by update_knowledge_entry
                 entry.source_type = form.source_type.data
                 db.session.commit()
+                invalidate_dashboard_cache(entry.user_id)
                 
                 flash('Knowledge entry updated successfully', 'success')
                 return redirect(url_for('knowledge_detail', entry_id=entry.id))
@@ -722,13 +740,13 @@ def setup_web_routes(app):
     @login_required
     def knowledge_delete(entry_id):
         """Delete a knowledge entry."""
-        entry = KnowledgeEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
+        user_id = current_user.id
+        # Delete the entry; the delete is scoped to the user, so nothing deleted means it isn't theirs
+        if not delete_knowledge_entry(entry_id, user_id):
+            abort(404)
         
-        # Delete the entry
-        if delete_knowledge_entry(entry_id):
-            flash('Knowledge entry deleted successfully', 'success')
-        else:
-            flash('Failed to delete knowledge entry', 'danger')
+        invalidate_dashboard_cache(user_id)
+        flash('Knowledge entry deleted successfully', 'success')
         
         return redirect(url_for('knowledge_list'))
     
@@ -739,7 +757,8 @@ def setup_web_routes(app):
         # Get all tags with counts
         tags_with_counts = get_trending_tags(limit=100)  # Get up to 100 tags
         
-        return render_template('knowledge/tags.html', tags=tags_with_counts)
+        # The ETag follows the rendered counts, so revisits get a 304 until a tag is used or removed
+        return revalidated_page(render_template('knowledge/tags.html', tags=tags_with_counts))
     
     @app.route('/knowledge/tag/<tag_name>')
     @login_required
@@ -747,16 +766,18 @@ def setup_web_routes(app):
         """View knowledge entries by tag."""
         tag = Tag.query.filter_by(name=tag_name.lower()).first_or_404()
         
-        page = request.args.get('page', 1, type=int)
         per_page = 10
         
-        # Get entries with this tag
-        entries = KnowledgeEntry.query.filter(
-            KnowledgeEntry.tags.any(Tag.id == tag.id),
-            KnowledgeEntry.user_id == current_user.id
-        ).order_by(
-            KnowledgeEntry.updated_at.desc()
-        ).paginate(page=page, per_page=per_page)
+        # Get entries with this tag, joining the association table directly (one row per entry and tag)
+        entries = keyset_paginate(
+            KnowledgeEntry.query.join(
+                entry_tags, entry_tags.c.knowledge_entry_id == KnowledgeEntry.id
+            ).filter(
+                entry_tags.c.tag_id == tag.id,
+                KnowledgeEntry.user_id == current_user.id
+            ).options(*KNOWLEDGE_LIST_OPTIONS),
+            KnowledgeEntry.updated_at, KnowledgeEntry.id, request.args, per_page=per_page
+        )
         
         return render_template('knowledge/by_tag.html', 
                               tag=tag, 
@@ -766,41 +787,42 @@ def setup_web_routes(app):
     @login_required
     def document_extract_knowledge(document_id):
         """Extract knowledge from a document automatically."""
-        document = Document.query.filter_by(id=document_id, user_id=current_user.id).first_or_404()
+        user_id = current_user.id
+        document = get_user_document_or_404(document_id, user_id)
         
         # Ensure document is processed
         if not document.processed:
             flash('Document must be processed before extracting knowledge', 'danger')
             return redirect(url_for('document_detail', document_id=document.id))
         
-        # Extract knowledge
-        try:
-            entries = extract_knowledge_from_document(document, current_user.id)
-            
-            if entries:
-                flash(f'Successfully extracted {len(entries)} knowledge entries', 'success')
-            else:
-                flash('No knowledge entries could be extracted', 'warning')
-                
+        if document.knowledge_extraction_state in KNOWLEDGE_EXTRACTION_ACTIVE_STATES:
+            flash('Knowledge extraction is already in progress for this document', 'info')
             return redirect(url_for('document_detail', document_id=document.id))
         
-        except Exception as e:
-            flash(f'Error extracting knowledge: {str(e)}', 'danger')
-            return redirect(url_for('document_detail', document_id=document.id))
+        # Extraction calls the language model, so it runs in the background; the
+        # status endpoint reports its progress as knowledge_state
+        document.knowledge_extraction_state = 'queued'
+        db.session.commit()
+        extract_document_knowledge.delay(document.id, user_id)
         
-    @app.route('/plugins')
-    @login_required
-    def plugins_list():
-        """List all available plugins."""
-        from plugins import get_plugin_info
+        flash('Knowledge extraction has started. New entries will appear in the Knowledge Vault when it finishes.', 'info')
+        return redirect(url_for('document_detail', document_id=document.id))
         
+    @lru_cache(maxsize=None)
+    def plugin_listing():
+        """Plugin manifests with download URLs, built on the first request since plugins only change on deploy."""
         plugins = get_plugin_info()
         # Add download URLs
         for plugin in plugins:
             if plugin.get('name'):
                 plugin['download_url'] = url_for('download_plugin', plugin_name=plugin['name'])
-                
-        return render_template('plugins.html', plugins=plugins)
+        return tuple(plugins)
+    
+    @app.route('/plugins')
+    @login_required
+    def plugins_list():
+        """List all available plugins."""
+        return render_template('plugins.html', plugins=plugin_listing())
         
     @app.route('/api/plugins/google-docs/download')
     @login_required
@@ -818,103 +840,37 @@ def setup_web_routes(app):
     @login_required
     def download_plugin(plugin_name):
         """Generate and download a plugin package."""
-        import tempfile
-        import zipfile
-        import shutil
-        import importlib
-        
         # Check if the plugin exists
-        if plugin_name not in ['ms_word', 'google_docs']:
+        if plugin_name not in PLUGIN_DOWNLOAD_NAMES:
             abort(404, description="Plugin not found")
         
-        # Create temporary directory for plugin files    
-        temp_dir = tempfile.mkdtemp()
-        
         try:
-            # Generate plugin files based on plugin type
-            if plugin_name == 'ms_word':
-                from plugins.ms_word import get_plugin
-                plugin = get_plugin()
-                
-                # Export plugin files
-                if not plugin or not plugin.export_add_in_files(temp_dir):
-                    abort(500, description="Failed to generate Microsoft Word plugin")
-                    
-                # Generate a zip file
-                zip_file_path = os.path.join(temp_dir, 'legal_document_analyzer_word.zip')
-                with zipfile.ZipFile(zip_file_path, 'w') as zipf:
-                    # Add manifest file
-                    manifest_path = os.path.join(temp_dir, 'manifest.xml')
-                    if os.path.exists(manifest_path):
-                        zipf.write(manifest_path, os.path.basename(manifest_path))
-                        
-                    # Add assets directory
-                    assets_dir = os.path.join(temp_dir, 'assets')
-                    if os.path.exists(assets_dir):
-                        for root, dirs, files in os.walk(assets_dir):
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                zipf.write(file_path, os.path.relpath(file_path, temp_dir))
-                
-                # Send the zip file
-                return send_from_directory(
-                    directory=temp_dir,
-                    path='legal_document_analyzer_word.zip',
-                    as_attachment=True,
-                    download_name='legal_document_analyzer_word.zip'
-                )
-                
-            elif plugin_name == 'google_docs':
-                from plugins.google_docs import get_plugin
-                plugin = get_plugin()
-                google_docs_module = importlib.import_module('plugins.google_docs')
-                
-                # Generate a zip file
-                zip_file_path = os.path.join(temp_dir, 'legal_document_analyzer_docs.zip')
-                with zipfile.ZipFile(zip_file_path, 'w') as zipf:
-                    # Add plugin directory contents
-                    plugin_dir = os.path.dirname(os.path.abspath(google_docs_module.__file__))
-                    
-                    # Add appsscript.json
-                    appsscript_path = os.path.join(plugin_dir, 'appsscript.json')
-                    if os.path.exists(appsscript_path):
-                        zipf.write(appsscript_path, os.path.basename(appsscript_path))
-                        
-                    # Add any JavaScript files
-                    code_dir = os.path.join(plugin_dir, 'code')
-                    if os.path.exists(code_dir):
-                        for root, dirs, files in os.walk(code_dir):
-                            for file in files:
-                                if file.endswith('.js') or file.endswith('.html'):
-                                    file_path = os.path.join(root, file)
-                                    zipf.write(file_path, os.path.relpath(file_path, plugin_dir))
-                
-                # Send the zip file
-                return send_from_directory(
-                    directory=temp_dir,
-                    path='legal_document_analyzer_docs.zip',
-                    as_attachment=True,
-                    download_name='legal_document_analyzer_docs.zip'
-                )
+            # Zipped once per plugin version, then served from the package cache
+            package_path = get_plugin_package(plugin_name, app.config['PLUGIN_CACHE_DIR'])
         except Exception as e:
             logger.error(f"Error generating plugin package: {str(e)}")
             abort(500, description=f"Failed to generate plugin package: {str(e)}")
-        finally:
-            # Clean up temporary directory
-            try:
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-            except Exception as cleanup_error:
-                logger.error(f"Error cleaning up temporary directory: {str(cleanup_error)}")
-                pass
+        
+        # Send the zip file with conditional and range handling. The ETag is the package's content
+        # fingerprint rather than the file's mtime, so it agrees between workers that each built a copy
+        response = send_file(
+            package_path,
+            mimetype='application/zip',
+            as_attachment=True,
+            download_name=PLUGIN_DOWNLOAD_NAMES[plugin_name],
+            max_age=PLUGIN_DOWNLOAD_MAX_AGE,
+            etag=os.path.splitext(os.path.basename(package_path))[0]
+        )
+        # Downloads require a login, so only the browser may keep a copy (send_file marks it public)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
                 
     # Onboarding Wizard Routes
     @app.route('/onboarding')
     @login_required
     def onboarding_wizard():
         """Entry point for the user onboarding wizard."""
-        from app import db  # Import db at the beginning
-        
         try:
             # Initialize onboarding progress if it doesn't exist
             progress = OnboardingService.get_progress(current_user)
@@ -930,7 +886,6 @@ def setup_web_routes(app):
         except Exception as e:
             # Something went wrong, log the error and show a generic message
             logger.error(f"Error accessing onboarding wizard: {str(e)}")
-            db.session.rollback()  # Ensure any failed transaction is rolled back
             flash('We encountered an issue with the onboarding process. Please try again.', 'danger')
             return redirect(url_for('dashboard'))
         
@@ -938,22 +893,18 @@ def setup_web_routes(app):
     @login_required
     def onboarding_next_step(current_step):
         """Proceed to the next step in the onboarding wizard."""
-        from app import db  # Import db at the beginning
-        
         try:
-            # Get current progress - this method now has built-in transaction handling
-            progress = OnboardingService.get_progress(current_user)
-                
-            # Validate the step
-            if progress.current_step != current_step:
+            # Mark this step as completed and move to the next, if the user is on it
+            next_step = OnboardingService.advance_step(current_user, current_step)
+            if next_step is None:
+                # A retried final submit finds the wizard already finished; nothing was written
+                if current_step == FINAL_STEP and OnboardingService.get_progress(current_user).onboarding_completed:
+                    return redirect(url_for('dashboard'))
                 flash('Invalid step transition.', 'warning')
                 return redirect(url_for('onboarding_wizard'))
             
-            # Mark this step as completed and move to the next
-            OnboardingService.complete_step(current_user, current_step)
-            
             # If we've completed all steps, redirect to dashboard
-            if current_step == 5:
+            if next_step > FINAL_STEP:
                 flash('Congratulations! You have completed the onboarding process.', 'success')
                 return redirect(url_for('dashboard'))
                 
@@ -961,7 +912,6 @@ def setup_web_routes(app):
             return redirect(url_for('onboarding_wizard'))
         except Exception as e:
             logger.error(f"Error in onboarding process: {str(e)}")
-            db.session.rollback()  # Ensure any failed transaction is rolled back
             flash('An error occurred during the onboarding process. Please try again.', 'danger')
             return redirect(url_for('onboarding_wizard'))
         
@@ -969,15 +919,12 @@ def setup_web_routes(app):
     @login_required
     def onboarding_skip():
         """Skip the onboarding process."""
-        from app import db  # Import db at the beginning
-        
         try:    
             OnboardingService.skip_onboarding(current_user)
             flash('Onboarding has been skipped. You can access it again from your profile settings if needed.', 'info')
             return redirect(url_for('dashboard'))
         except Exception as e:
             logger.error(f"Error skipping onboarding: {str(e)}")
-            db.session.rollback()  # Ensure any failed transaction is rolled back
             flash('An error occurred when skipping the onboarding process. Please try again.', 'danger')
             return redirect(url_for('onboarding_wizard'))
         
@@ -985,8 +932,6 @@ def setup_web_routes(app):
     @login_required
     def onboarding_restart():
         """Restart the onboarding process."""
-        from app import db  # Import db at the beginning
-        
         try:    
             # Initialize new onboarding progress
             OnboardingService.initialize_onboarding(current_user)
@@ -994,6 +939,5 @@ def setup_web_routes(app):
             return redirect(url_for('onboarding_wizard'))
         except Exception as e:
             logger.error(f"Error restarting onboarding: {str(e)}")
-            db.session.rollback()  # Ensure any failed transaction is rolled back
             flash('An error occurred when restarting the onboarding process. Please try again.', 'danger')
             return redirect(url_for('dashboard'))
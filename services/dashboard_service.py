@@ -0,0 +1,114 @@
+"""
+Dashboard service for the per-user counters and recent-activity lists.
+"""
+import logging
+from sqlalchemy import func, select
+from app import db, cache
+from models import Document, Brief, Statute, KnowledgeEntry
+
+logger = logging.getLogger(__name__)
+
+# Number of items shown in each recent-activity list
+RECENT_LIMIT = 5
+
+@cache.memoize()
+def get_dashboard_stats(user_id):
+    """
+    Compute the dashboard counters for a user in a single database round trip.
+
+    Each counter is a scalar subquery of one SELECT, so the counts stay
+    independent (no join fan-out) while only one statement is executed. The
+    result is cached with the dashboard and also serves as the list totals
+    of the REST API.
+
+    Args:
+        user_id (int): ID of the user
+
+    Returns:
+        dict: Document, brief, knowledge entry and outdated statute counts
+    """
+    document_count = db.session.query(func.count(Document.id)).filter(
+        Document.user_id == user_id
+    ).scalar_subquery()
+    brief_count = db.session.query(func.count(Brief.id)).filter(
+        Brief.user_id == user_id
+    ).scalar_subquery()
+    knowledge_count = db.session.query(func.count(KnowledgeEntry.id)).filter(
+        KnowledgeEntry.user_id == user_id
+    ).scalar_subquery()
+    # Kept as "= false" rather than "IS false" so ix_statutes_document_current can serve the probe
+    outdated_statutes = db.session.query(func.count()).select_from(Statute).join(
+        Document, Statute.document_id == Document.id
+    ).filter(
+        Document.user_id == user_id,
+        Statute.is_current == False
+    ).scalar_subquery()
+
+    counts = db.session.query(
+        document_count.label('document_count'),
+        brief_count.label('brief_count'),
+        knowledge_count.label('knowledge_count'),
+        outdated_statutes.label('outdated_statutes')
+    ).one()
+
+    return dict(counts._mapping)
+
+@cache.memoize()
+def get_dashboard_data(user_id):
+    """
+    Build the cacheable dashboard payload for a user.
+
+    Only plain values are returned (no ORM instances) so the result can be
+    stored in any cache backend and rendered without touching the session.
+
+    Args:
+        user_id (int): ID of the user
+
+    Returns:
+        dict: Stats plus recent documents, briefs and knowledge entries
+    """
+    # Plain column rows: the payload is built from them directly, with no ORM instances to load
+    recent_documents = db.session.execute(
+        select(
+            Document.id, Document.filename, Document.original_filename, Document.uploaded_at, Document.processed
+        ).where(Document.user_id == user_id).order_by(
+            Document.uploaded_at.desc()
+        ).limit(RECENT_LIMIT)
+    ).all()
+
+    recent_briefs = db.session.execute(
+        select(
+            Brief.id, Brief.title, Document.original_filename.label('document_filename'), Brief.generated_at
+        ).join(Document, Brief.document_id == Document.id).where(Brief.user_id == user_id).order_by(
+            Brief.generated_at.desc()
+        ).limit(RECENT_LIMIT)
+    ).all()
+
+    recent_knowledge = db.session.execute(
+        select(
+            KnowledgeEntry.id, KnowledgeEntry.title, KnowledgeEntry.source_type,
+            KnowledgeEntry.created_at, KnowledgeEntry.is_verified
+        ).where(KnowledgeEntry.user_id == user_id).order_by(
+            KnowledgeEntry.created_at.desc()
+        ).limit(RECENT_LIMIT)
+    ).all()
+
+    return {
+        'stats': get_dashboard_stats(user_id),
+        'recent_documents': [dict(row._mapping) for row in recent_documents],
+        'recent_briefs': [dict(row._mapping) for row in recent_briefs],
+        'recent_knowledge': [dict(row._mapping) for row in recent_knowledge]
+    }
+
+def invalidate_dashboard_cache(user_id):
+    """
+    Drop the cached dashboard payload for a user after their data changes.
+
+    Args:
+        user_id (int): ID of the user
+    """
+    try:
+        cache.delete_memoized(get_dashboard_data, user_id)
+        cache.delete_memoized(get_dashboard_stats, user_id)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate dashboard cache for user {user_id}: {str(e)}")
@@ -14,7 +14,7 @@ from docx import Document as DocxDocument
 logger = logging.getLogger(__name__)
 
 # Define allowed file extensions
-ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'rtf'}
+ALLOWED_EXTENSIONS = frozenset({'pdf', 'doc', 'docx', 'txt', 'rtf'})
 
 def is_allowed_file(filename):
     """
@@ -26,7 +26,8 @@ def is_allowed_file(filename):
     Returns:
         True if the file extension is allowed, False otherwise
     """
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    _, dot, extension = filename.rpartition('.')
+    return bool(dot) and extension.lower() in ALLOWED_EXTENSIONS
 
 class DocumentParser:
     """Service for parsing different document formats."""
@@ -35,12 +36,13 @@ class DocumentParser:
         """Initialize the document parser."""
         logger.info("Document parser initialized")
     
-    def convert_to_txt(self, file_path: str) -> str:
+    def convert_to_txt(self, file_path: str, text_content: Optional[str] = None) -> str:
         """
         Convert a document to text file format.
         
         Args:
             file_path: Path to the original document file
+            text_content: Text already extracted from the document, to avoid parsing it again
             
         Returns:
             Path to the new txt file, or empty string if conversion failed
@@ -50,7 +52,8 @@ class DocumentParser:
             return ""
         
         # Extract the text content from the document
-        text_content = self.parse_document(file_path)
+        if text_content is None:
+            text_content = self.parse_document(file_path)
         
         if not text_content or len(text_content) < 10:
             logger.error(f"Failed to extract meaningful text from {file_path}")
@@ -72,12 +75,13 @@ class DocumentParser:
             logger.error(f"Error writing text file: {str(e)}")
             return ""
         
-    def parse_document(self, file_path: str) -> str:
+    def parse_document(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """
         Parse a document and extract its text content.
         
         Args:
             file_path: Path to the document file
+            max_chars: For TXT files, read at most this many characters instead of the whole file
             
         Returns:
             The extracted text content
@@ -111,7 +115,7 @@ class DocumentParser:
             elif ext in ['.docx', '.doc']:
                 return self._parse_docx(file_path)
             elif ext == '.txt':
-                return self._parse_txt(file_path)
+                return self._parse_txt(file_path, max_chars)
             elif ext == '.rtf':
                 # For RTF files, convert to text and treat as TXT
                 logger.info(f"RTF file detected, using basic text extraction: {file_path}")
@@ -231,25 +235,28 @@ class DocumentParser:
             logger.error(f"Error parsing DOCX: {str(e)}")
             return "There was an error parsing this document. It may be corrupted or in an unsupported format. Please try another document."
             
-    def _parse_txt(self, file_path: str) -> str:
+    def _parse_txt(self, file_path: str, max_chars: Optional[int] = None) -> str:
         """
         Extract text from a TXT file.
         
         Args:
             file_path: Path to the TXT file
+            max_chars: Read at most this many characters (the whole file if None)
             
         Returns:
             The extracted text content
         """
+        # read(-1) reads to the end of the file
+        read_size = -1 if max_chars is None else max_chars
         try:
             # First try UTF-8
             try:
                 with open(file_path, 'r', encoding='utf-8') as file:
-                    text = file.read()
+                    text = file.read(read_size)
             except UnicodeDecodeError:
                 # If UTF-8 fails, try with error replacement
                 with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
-                    text = file.read()
+                    text = file.read(read_size)
                 logger.warning(f"Used fallback encoding for TXT file: {file_path}")
                 
             # Clean up text
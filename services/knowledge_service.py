@@ -5,7 +5,9 @@ This module provides functionality for creating, managing, and searching knowled
 import datetime
 from flask import current_app
 import spacy
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from app import cache
 from models import db, KnowledgeEntry, Tag, Reference, SearchLog, knowledge_tags
 from services.openai_service import extract_legal_entities, generate_document_summary
 from services.text_analysis import analyze_text_for_topics
@@ -17,6 +19,50 @@ except OSError:
     # Fallback to a simpler model if the larger one isn't available
     nlp = spacy.load("en_core_web_sm")
 
+# Seconds the tag lists stay cached; they are also invalidated whenever tagging changes
+TAG_CACHE_TIMEOUT = 60
+
+# Number of most-used tags kept in the cached ranking
+TAG_RANKING_LIMIT = 100
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING for new tag names
+TAG_UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def get_or_create_tags(tag_names, user_id):
+    """
+    Resolve tag names to Tag rows, creating the missing ones in one batched insert.
+    
+    Where the database supports it, names another request created in the
+    meantime are skipped by the insert instead of failing the unique constraint.
+    
+    Args:
+        tag_names (list): Tag names in any case; duplicates are ignored
+        user_id (int): User recorded as creator of new tags
+        
+    Returns:
+        list: Tags in the order the names were first given
+    """
+    names = list(dict.fromkeys(name.lower() for name in tag_names))
+    if not names:
+        return []
+    
+    tags_by_name = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names)).all()}
+    missing = [name for name in names if name not in tags_by_name]
+    if missing:
+        upsert = TAG_UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+        if upsert is not None:
+            db.session.execute(upsert(Tag).values(
+                [{'name': name, 'user_id': user_id} for name in missing]
+            ).on_conflict_do_nothing(index_elements=['name']))
+            tags_by_name.update((tag.name, tag) for tag in Tag.query.filter(Tag.name.in_(missing)).all())
+        else:
+            new_tags = [Tag(name=name, user_id=user_id) for name in missing]
+            db.session.add_all(new_tags)
+            db.session.flush()
+            tags_by_name.update((tag.name, tag) for tag in new_tags)
+    
+    return [tags_by_name[name] for name in names]
+
 def create_knowledge_entry(title, content, user_id, document_id=None, source_type=None, is_verified=False):
     """
     Create a new knowledge entry.
@@ -87,14 +133,7 @@ def create_knowledge_entry(title, content, user_id, document_id=None, source_typ
     # Automatically tag the entry based on content
     try:
         topics = analyze_text_for_topics(content)
-        for topic in topics:
-            # Find or create the tag
-            tag = Tag.query.filter_by(name=topic.lower()).first()
-            if not tag:
-                tag = Tag(name=topic.lower(), user_id=user_id)
-                db.session.add(tag)
-                db.session.flush()
-            
+        for tag in get_or_create_tags(topics, user_id):
             # Add the tag to the entry
             if tag not in entry.tags:
                 entry.tags.append(tag)
@@ -103,9 +142,10 @@ def create_knowledge_entry(title, content, user_id, document_id=None, source_typ
     
     # Commit all changes
     db.session.commit()
+    invalidate_tag_cache()
     return entry
 
-def search_knowledge(query, user_id, tags=None, limit=20, offset=0):
+def search_knowledge(query, user_id, tags=None, limit=20, offset=0, options=()):
     """
     Search the knowledge base using natural language queries.
     
@@ -115,6 +155,7 @@ def search_knowledge(query, user_id, tags=None, limit=20, offset=0):
         tags (list, optional): List of tag names to filter by
         limit (int, optional): Max number of results to return
         offset (int, optional): Offset for pagination
+        options (tuple, optional): Loader options applied to the returned entries
         
     Returns:
         dict: Search results with entries and metadata
@@ -132,10 +173,12 @@ def search_knowledge(query, user_id, tags=None, limit=20, offset=0):
     
     # Apply tag filtering if specified
     if tags and len(tags) > 0:
-        tag_objects = Tag.query.filter(Tag.name.in_([t.lower() for t in tags])).all()
-        if tag_objects:
-            tag_ids = [tag.id for tag in tag_objects]
-            search_query = search_query.filter(KnowledgeEntry.tags.any(Tag.id.in_(tag_ids)))
+        tag_ids = db.session.scalars(select(Tag.id).where(Tag.name.in_([t.lower() for t in tags]))).all()
+        if tag_ids:
+            # Semi-join on the association table (covered by ix_knowledge_tags_tag) instead of a correlated EXISTS
+            search_query = search_query.filter(KnowledgeEntry.id.in_(
+                select(knowledge_tags.c.knowledge_entry_id).where(knowledge_tags.c.tag_id.in_(tag_ids))
+            ))
     
     # Apply keyword search if we have keywords
     if keywords:
@@ -159,7 +202,7 @@ def search_knowledge(query, user_id, tags=None, limit=20, offset=0):
     total_count = search_query.count()
     
     # Apply pagination
-    search_query = search_query.limit(limit).offset(offset)
+    search_query = search_query.options(*options).limit(limit).offset(offset)
     
     # Execute the query
     results = search_query.all()
@@ -177,40 +220,61 @@ def search_knowledge(query, user_id, tags=None, limit=20, offset=0):
         'query': query
     }
 
+@cache.memoize(timeout=TAG_CACHE_TIMEOUT)
+def _tag_usage_ranking():
+    # Counted on the association table alone, which ix_knowledge_tags_tag covers,
+    # then joined to tags for the top TAG_RANKING_LIMIT rows only
+    usage = db.session.query(
+        knowledge_tags.c.tag_id,
+        func.count().label('usage_count')
+    ).group_by(
+        knowledge_tags.c.tag_id
+    ).order_by(
+        func.count().desc()
+    ).limit(TAG_RANKING_LIMIT).subquery()
+    
+    # Plain column rows; the result is cached, so no Tag instances are built for it
+    rows = db.session.query(
+        Tag.id, Tag.name, Tag.description, usage.c.usage_count
+    ).join(
+        usage, Tag.id == usage.c.tag_id
+    ).order_by(usage.c.usage_count.desc()).all()
+    
+    return [dict(row._mapping) for row in rows]
+
 def get_trending_tags(limit=10):
     """
     Get the most frequently used tags.
     
+    Every caller slices one cached ranking, so the sidebar (10 tags) and the
+    tag index (100 tags) share a single aggregate per cache period.
+    
     Args:
-        limit (int, optional): Maximum number of tags to return
+        limit (int, optional): Maximum number of tags to return, up to TAG_RANKING_LIMIT
         
     Returns:
         list: List of tags with usage counts
     """
-    # Use SQLAlchemy to count tag occurrences through the association table
-    tags_with_counts = db.session.query(
-        Tag,
-        func.count(knowledge_tags.c.knowledge_entry_id).label('usage_count')
-    ).join(
-        knowledge_tags,
-        Tag.id == knowledge_tags.c.tag_id
-    ).group_by(
-        Tag.id
-    ).order_by(
-        func.count(knowledge_tags.c.knowledge_entry_id).desc()
-    ).limit(limit).all()
-    
-    # Format the result
-    result = []
-    for tag, count in tags_with_counts:
-        result.append({
-            'id': tag.id,
-            'name': tag.name,
-            'description': tag.description,
-            'usage_count': count
-        })
-    
-    return result
+    return _tag_usage_ranking()[:limit]
+
+@cache.memoize(timeout=TAG_CACHE_TIMEOUT)
+def get_all_tags():
+    """
+    Get every tag, for tag pickers and listings.
+    
+    Returns:
+        list: List of tags as dicts with id, name and description
+    """
+    rows = db.session.query(Tag.id, Tag.name, Tag.description).order_by(Tag.name).all()
+    return [dict(row._mapping) for row in rows]
+
+def invalidate_tag_cache():
+    """Drop the cached tag lists after tags or their entries change."""
+    try:
+        cache.delete_memoized(_tag_usage_ranking)
+        cache.delete_memoized(get_all_tags)
+    except Exception as e:
+        current_app.logger.warning(f"Failed to invalidate tag cache: {e}")
 
 def get_knowledge_entry(entry_id):
     """
@@ -262,50 +326,45 @@ def update_knowledge_entry(entry_id, title=None, content=None, is_verified=None,
     
     # Update tags if provided
     if tags is not None:
-        # Clear existing tags
-        entry.tags = []
-        
-        # Add new tags
-        for tag_name in tags:
-            tag = Tag.query.filter_by(name=tag_name.lower()).first()
-            if not tag:
-                # Create the tag if it doesn't exist
-                tag = Tag(
-                    name=tag_name.lower(),
-                    user_id=entry.user_id
-                )
-                db.session.add(tag)
-                db.session.flush()
-            
-            entry.tags.append(tag)
+        # Replace the existing tags, creating any that don't exist yet
+        entry.tags = get_or_create_tags(tags, entry.user_id)
     
     # Update the timestamp
     entry.updated_at = datetime.datetime.utcnow()
     
     # Save changes
     db.session.commit()
+    invalidate_tag_cache()
     return entry
 
-def delete_knowledge_entry(entry_id):
+def delete_knowledge_entry(entry_id, user_id=None):
     """
-    Delete a knowledge entry.
+    Delete a knowledge entry with keyed DELETEs, without loading it.
     
     Args:
         entry_id (int): ID of the entry to delete
+        user_id (int, optional): Only delete the entry if this user owns it
         
     Returns:
         bool: True if successful, False otherwise
     """
-    entry = KnowledgeEntry.query.get(entry_id)
-    if not entry:
+    entry_filter = [KnowledgeEntry.id == entry_id]
+    if user_id is not None:
+        entry_filter.append(KnowledgeEntry.user_id == user_id)
+    
+    # Tag links have no database cascade, so clear them first; references cascade in the database
+    db.session.execute(delete(knowledge_tags).where(
+        knowledge_tags.c.knowledge_entry_id.in_(select(KnowledgeEntry.id).where(*entry_filter))
+    ))
+    result = db.session.execute(
+        delete(KnowledgeEntry).where(*entry_filter).execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.rollback()
         return False
     
-    # Delete all references first
-    Reference.query.filter_by(knowledge_entry_id=entry_id).delete()
-    
-    # Delete the entry
-    db.session.delete(entry)
     db.session.commit()
+    invalidate_tag_cache()
     return True
 
 def extract_knowledge_from_document(document, user_id):
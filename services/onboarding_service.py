@@ -7,11 +7,28 @@ import shutil
 import time
 from flask import current_app, flash
 from models import OnboardingProgress, Document, db
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy import text, update
 
 logger = logging.getLogger(__name__)
 
+# Sample document copied into a new user's uploads for the tutorial
+TUTORIAL_DOCUMENT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'sample_documents',
+    'sample_legal_brief.txt'
+)
+
+# Completion flag set when each wizard step is finished
+STEP_COMPLETION_FIELDS = {
+    1: 'welcome_completed',
+    2: 'document_upload_completed',
+    3: 'document_analysis_completed',
+    4: 'brief_generation_completed',
+    5: 'knowledge_creation_completed',
+}
+FINAL_STEP = 5
+
 class OnboardingService:
     """Service for managing user onboarding process."""
 
@@ -88,108 +105,71 @@ class OnboardingService:
         return progress
 
     @staticmethod
-    def complete_step(user, step_number):
+    def _create_progress(user):
+        """Insert a first-step progress row for a user known to have none."""
+        progress = OnboardingProgress(user_id=user.id, current_step=1)
+        db.session.add(progress)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another request created it first (user_id is unique)
+            db.session.rollback()
+            progress = OnboardingProgress.query.filter_by(user_id=user.id).one()
+        return progress
+
+    @staticmethod
+    def advance_step(user, expected_step):
         """
-        Mark a step as completed in the onboarding process.
+        Mark a step as completed and move to the next one in a single UPDATE.
+        
+        The update only applies while the user is still on the expected step,
+        so the step check and the transition need no prior SELECT.
         
         Args:
             user: The user to update progress for
-            step_number: The step number to mark as completed
+            expected_step: The step the user is completing
             
         Returns:
-            OnboardingProgress: The updated onboarding progress object
+            int: The new current step, or None if the user was not on that step
         """
-        # Try up to 3 times to handle transient database errors
-        for attempt in range(3):
-            try:
-                # First, make sure we're starting with a clean session
-                db.session.rollback()
-                
-                # Get progress with error handling
-                try:
-                    progress = OnboardingProgress.query.filter_by(user_id=user.id).first()
-                    
-                    if not progress:
-                        logger.info(f"No progress found for user {user.id}, initializing")
-                        progress = OnboardingService.initialize_onboarding(user)
-                except SQLAlchemyError as e:
-                    db.session.rollback()
-                    logger.warning(f"Error querying for progress, retrying... (attempt {attempt+1}): {str(e)}")
-                    # Reset session and try again
-                    OnboardingService.reset_database_session()
-                    continue
-                
-                # Update appropriate field based on step number
-                logger.info(f"Completing step {step_number} for user {user.id}")
-                if step_number == 1:
-                    progress.welcome_completed = True
-                    progress.current_step = 2
-                elif step_number == 2:
-                    progress.document_upload_completed = True
-                    progress.current_step = 3
-                    
-                    # Create sample document for tutorial if not already created
-                    if not progress.tutorial_document_id:
-                        try:
-                            document = OnboardingService.create_tutorial_document(user)
-                            progress.tutorial_document_id = document.id
-                        except Exception as doc_error:
-                            logger.error(f"Error creating tutorial document: {str(doc_error)}")
-                            # Continue with the step even if document creation fails
-                            pass
-                        
-                elif step_number == 3:
-                    progress.document_analysis_completed = True
-                    progress.current_step = 4
-                elif step_number == 4:
-                    progress.brief_generation_completed = True
-                    progress.current_step = 5
-                elif step_number == 5:
-                    progress.knowledge_creation_completed = True
-                    progress.onboarding_completed = True
-                    progress.current_step = 6
-                
-                # Try to commit the changes
-                try:
-                    db.session.commit()
-                    logger.info(f"Successfully completed step {step_number} for user {user.id}")
-                    return progress
-                except SQLAlchemyError as commit_error:
-                    db.session.rollback()
-                    logger.error(f"Error committing step completion: {str(commit_error)}")
-                    # Try to reset the session before retrying
-                    OnboardingService.reset_database_session()
-                
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                logger.error(f"Error completing onboarding step (attempt {attempt+1}): {str(e)}")
-                # Try to reset the session before the next attempt
-                OnboardingService.reset_database_session()
+        completed_field = STEP_COMPLETION_FIELDS.get(expected_step)
+        if not completed_field:
+            return None
         
-        # If we've tried multiple times and failed, return the progress object anyway
-        # to allow the user to continue with the onboarding process
-        logger.warning(f"Failed to save step {step_number} completion after multiple attempts")
+        values = {completed_field: True, 'current_step': expected_step + 1}
+        if expected_step == FINAL_STEP:
+            values['onboarding_completed'] = True
         
-        # Create a transient object with the completed step
-        progress = OnboardingProgress(user_id=user.id, current_step=step_number + 1)
+        result = db.session.execute(
+            update(OnboardingProgress).where(
+                OnboardingProgress.user_id == user.id,
+                OnboardingProgress.current_step == expected_step
+            ).values(**values).execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        logger.info(f"Completed onboarding step {expected_step} for user {user.id}")
         
-        # Mark the appropriate steps as completed
-        if step_number >= 1:
-            progress.welcome_completed = True
-        if step_number >= 2:
-            progress.document_upload_completed = True
-        if step_number >= 3:
-            progress.document_analysis_completed = True
-        if step_number >= 4:
-            progress.brief_generation_completed = True
-        if step_number >= 5:
-            progress.knowledge_creation_completed = True
-            progress.onboarding_completed = True
-            
-        # Ensure this isn't tracked by the session
-        db.session.expunge(progress) if progress in db.session else None
+        # Step 2 hands the user a sample document to analyze in the next steps
+        if expected_step == 2:
+            try:
+                document = OnboardingService.create_tutorial_document(user)
+                if document:
+                    db.session.execute(
+                        update(OnboardingProgress).where(
+                            OnboardingProgress.user_id == user.id,
+                            OnboardingProgress.tutorial_document_id.is_(None)
+                        ).values(tutorial_document_id=document.id).execution_options(synchronize_session=False)
+                    )
+                    db.session.commit()
+            except Exception as doc_error:
+                db.session.rollback()
+                logger.error(f"Error creating tutorial document: {str(doc_error)}")
+                # Continue with the step even if document creation fails
         
-        return progress
+        return expected_step + 1
 
     @staticmethod
     def skip_onboarding(user):
@@ -198,76 +178,22 @@ class OnboardingService:
         
         Args:
             user: The user to skip onboarding for
-            
-        Returns:
-            OnboardingProgress: The updated onboarding progress object with all steps completed
         """
-        # Try up to 3 times to handle transient database errors
-        for attempt in range(3):
-            try:
-                # First, make sure we're starting with a clean session
-                db.session.rollback()
-                
-                # Get progress with error handling
-                try:
-                    progress = OnboardingProgress.query.filter_by(user_id=user.id).first()
-                    
-                    if not progress:
-                        logger.info(f"No progress found for user {user.id}, initializing")
-                        progress = OnboardingService.initialize_onboarding(user)
-                except SQLAlchemyError as e:
-                    db.session.rollback()
-                    logger.warning(f"Error querying for progress, retrying... (attempt {attempt+1}): {str(e)}")
-                    # Reset session and try again
-                    OnboardingService.reset_database_session()
-                    continue
-                
-                # Mark all steps as completed
-                logger.info(f"Skipping onboarding for user {user.id}")
-                progress.welcome_completed = True
-                progress.document_upload_completed = True
-                progress.document_analysis_completed = True
-                progress.brief_generation_completed = True
-                progress.knowledge_creation_completed = True
-                progress.onboarding_completed = True
-                progress.current_step = 6
-                
-                # Try to commit the changes
-                try:
-                    db.session.commit()
-                    logger.info(f"Successfully skipped onboarding for user {user.id}")
-                    return progress
-                except SQLAlchemyError as commit_error:
-                    db.session.rollback()
-                    logger.error(f"Error committing onboarding skip: {str(commit_error)}")
-                    # Try to reset the session before retrying
-                    OnboardingService.reset_database_session()
-                
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                logger.error(f"Error skipping onboarding (attempt {attempt+1}): {str(e)}")
-                # Try to reset the session before the next attempt
-                OnboardingService.reset_database_session()
+        skipped = update(OnboardingProgress).where(
+            OnboardingProgress.user_id == user.id
+        ).values(
+            current_step=FINAL_STEP + 1,
+            onboarding_completed=True,
+            **{field: True for field in STEP_COMPLETION_FIELDS.values()}
+        ).execution_options(synchronize_session=False)
         
-        # If we've tried multiple times and failed, return a completed progress object anyway
-        logger.warning(f"Failed to save onboarding skip after multiple attempts for user {user.id}")
-        
-        # Create a transient object with all steps completed
-        progress = OnboardingProgress(
-            user_id=user.id,
-            current_step=6,
-            welcome_completed=True,
-            document_upload_completed=True,
-            document_analysis_completed=True,
-            brief_generation_completed=True,
-            knowledge_creation_completed=True,
-            onboarding_completed=True
-        )
-        
-        # Ensure this isn't tracked by the session
-        db.session.expunge(progress) if progress in db.session else None
-        
-        return progress
+        if db.session.execute(skipped).rowcount == 0:
+            # No progress row yet; create one and mark it skipped
+            logger.info(f"No progress found for user {user.id}, initializing")
+            OnboardingService._create_progress(user)
+            db.session.execute(skipped)
+        db.session.commit()
+        logger.info(f"Skipped onboarding for user {user.id}")
 
     @staticmethod
     def create_tutorial_document(user):
@@ -297,25 +223,19 @@ class OnboardingService:
                     return existing_doc
                 
                 # Source file path
-                source_path = os.path.join(
-                    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                    'sample_documents',
-                    'sample_legal_brief.txt'
-                )
+                source_path = TUTORIAL_DOCUMENT_PATH
                 
-                # Create uploads directory if it doesn't exist
+                # The uploads directory is created at startup in app.py
                 uploads_dir = current_app.config['UPLOAD_FOLDER']
-                os.makedirs(uploads_dir, exist_ok=True)
                 
                 # Create a unique filename
                 filename = f"tutorial_document_{user.id}.txt"
                 file_path = os.path.join(uploads_dir, filename)
                 
-                # Copy the sample file to the uploads directory
-                shutil.copy2(source_path, file_path)
-                
-                # Get file size
-                file_size = os.path.getsize(file_path)
+                # Copy the sample file to the uploads directory; the write position is its size
+                with open(source_path, 'rb') as source, open(file_path, 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+                    file_size = destination.tell()
                 
                 # Create document entry
                 document = Document(
@@ -335,6 +255,9 @@ class OnboardingService:
                 try:
                     db.session.commit()
                     logger.info(f"Created tutorial document for user {user.id}")
+                    
+                    from services.dashboard_service import invalidate_dashboard_cache
+                    invalidate_dashboard_cache(user.id)
                     return document
                 except SQLAlchemyError as commit_error:
                     db.session.rollback()
@@ -395,19 +318,17 @@ class OnboardingService:
         # First try with aggressive error handling
         for _ in range(3):  # Try up to 3 times
             try:
-                # Always rollback any pending transaction before querying
-                db.session.rollback()
-                
-                # Now query for the progress
+                # Failed attempts reset the session below, so the request's loaded
+                # objects (the current user) are not expired by a rollback up front
                 progress = OnboardingProgress.query.filter_by(user_id=user.id).first()
                 
                 if progress:
                     logger.info(f"Successfully retrieved onboarding progress for user {user.id}")
                     return progress
                     
-                # If no progress found, try to initialize it
+                # No progress yet; create it without querying for it a second time
                 logger.info(f"No onboarding progress found for user {user.id}, initializing")
-                return OnboardingService.initialize_onboarding(user)
+                return OnboardingService._create_progress(user)
                 
             except SQLAlchemyError as e:
                 # Log the error
@@ -4,15 +4,20 @@ This module provides dedicated OpenAI-powered document analysis features.
 """
 import os
 import json
+import hashlib
 import logging
 from datetime import datetime
 from openai import OpenAI
+from app import cache
 
 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
 
 logger = logging.getLogger(__name__)
 
+# Seconds a statute extraction is reused for identical text (re-analysis, repeated boilerplate)
+STATUTE_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+
 def parse_document_with_openai(document_text, document_type=None, extract_entities=True):
     """
     Parse a document using OpenAI's advanced capabilities.
@@ -173,6 +178,16 @@ def analyze_document_for_statutes(document_text):
         list: List of statute references with their context
     """
     try:
+        # Use a much smaller chunk of text to prevent memory issues
+        text_chunk = document_text[:2000] if len(document_text) > 2000 else document_text
+        
+        # The result depends only on the chunk, so identical text is answered from the cache
+        cache_key = f"statutes:{hashlib.sha256(text_chunk.encode('utf-8')).hexdigest()}"
+        cached_statutes = cache.get(cache_key)
+        if cached_statutes is not None:
+            logger.info(f"Reusing cached statute references for chunk (length: {len(text_chunk)})")
+            return cached_statutes
+        
         # Verify OpenAI API key is available
         api_key = os.environ.get("OPENAI_API_KEY")
         if not api_key:
@@ -182,8 +197,6 @@ def analyze_document_for_statutes(document_text):
         # Create client
         client = OpenAI(api_key=api_key)
         
-        # Use a much smaller chunk of text to prevent memory issues
-        text_chunk = document_text[:2000] if len(document_text) > 2000 else document_text
         logger.info(f"Analyzing document for statute references (chunk length: {len(text_chunk)})")
         
         response = client.chat.completions.create(
@@ -259,6 +272,7 @@ def analyze_document_for_statutes(document_text):
             formatted_statutes = formatted_statutes[:max_statutes]
                     
         logger.info(f"Found {len(formatted_statutes)} statute references in document")
+        cache.set(cache_key, formatted_statutes, timeout=STATUTE_CACHE_TIMEOUT)
         return formatted_statutes
         
     except Exception as e:
@@ -0,0 +1,136 @@
+"""
+Keyset (seek) pagination for the newest-first list views.
+
+Pages are addressed by the sort key of the last row shown instead of an
+offset, so each page is a LIMIT query that seeks through the per-user
+composite index and no COUNT(*) over the user's rows is needed.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import tuple_
+
+logger = logging.getLogger(__name__)
+
+class KeysetPage:
+    """One page of a keyset-paginated query, newest first."""
+
+    def __init__(self, items, has_next, has_prev, sort_attr):
+        self.items = items
+        self.has_next = has_next
+        self.has_prev = has_prev
+        self._sort_attr = sort_attr
+
+    @property
+    def next_args(self):
+        """Query arguments for the next (older) page."""
+        last = self.items[-1]
+        return {'after': getattr(last, self._sort_attr).isoformat(), 'after_id': last.id}
+
+    @property
+    def prev_args(self):
+        """Query arguments for the previous (newer) page."""
+        first = self.items[0]
+        return {'before': getattr(first, self._sort_attr).isoformat(), 'before_id': first.id}
+
+class OffsetPage:
+    """
+    One page of results whose total is already known (e.g. a logged search).
+
+    When the total may be stale (a cached counter), pass ``has_next`` taken
+    from the rows themselves so navigation never depends on the count.
+    """
+
+    def __init__(self, items, page, per_page, total, has_next=None):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self._has_next = has_next
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        if self._has_next is not None:
+            return self._has_next
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1
+
+    @property
+    def next_num(self):
+        return self.page + 1
+
+def offset_paginate(query, page, per_page, total):
+    """
+    Fetch one LIMIT/OFFSET page of an ordered query.
+
+    Args:
+        query: The filtered and ordered query
+        page (int): 1-based page number
+        per_page (int): Number of items per page
+        total (int): Approximate row count (e.g. a cached counter), only reported to clients
+
+    Returns:
+        OffsetPage: The items, with has_next decided by fetching one extra row
+    """
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return OffsetPage(rows[:per_page], page, per_page, total, has_next=len(rows) > per_page)
+
+def _parse_cursor(args, key):
+    value = args.get(key)
+    item_id = args.get(f'{key}_id', type=int)
+    if not value or item_id is None:
+        return None
+    try:
+        return datetime.fromisoformat(value), item_id
+    except ValueError:
+        logger.warning(f"Ignoring malformed pagination cursor {key}={value!r}")
+        return None
+
+def keyset_paginate(query, sort_column, id_column, args, per_page=10):
+    """
+    Fetch one page of a query ordered by (sort_column, id_column) descending.
+
+    Args:
+        query: The filtered query, without ordering
+        sort_column: Timestamp column the list is sorted by
+        id_column: Primary key column used as the tie-breaker
+        args: Request arguments holding the after/after_id or before/before_id cursor
+        per_page (int): Number of items per page
+
+    Returns:
+        KeysetPage: The items plus whether older and newer pages exist
+    """
+    key = tuple_(sort_column, id_column)
+    after = _parse_cursor(args, 'after')
+    before = None if after else _parse_cursor(args, 'before')
+
+    if before:
+        # Walk towards newer rows, then flip back to newest-first
+        rows = query.filter(key > tuple_(*before)).order_by(
+            sort_column.asc(), id_column.asc()
+        ).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        if after:
+            query = query.filter(key < tuple_(*after))
+        # One extra row tells us whether an older page exists without counting
+        rows = query.order_by(
+            sort_column.desc(), id_column.desc()
+        ).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    return KeysetPage(items, has_next and bool(items), has_prev and bool(items), sort_column.key)
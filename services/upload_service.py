@@ -0,0 +1,204 @@
+"""
+Upload service for writing multipart file uploads straight to disk.
+
+When the optional ``streaming-form-data`` package is installed, the request
+body is parsed incrementally by its C boundary scanner and the file part is
+written to the upload folder as it arrives, instead of being buffered by
+Werkzeug's form parser first. The size and SHA-256 digest of the upload are
+computed from the same chunks as they are written, so the file is never read
+back for them.
+
+Requests that go through Werkzeug's parser (the REST API, or when the package
+is missing) use ``UploadRequest``, which spools large file parts into the
+upload folder itself so saving them is a hard link rather than a copy.
+"""
+import os
+import time
+import uuid
+import secrets
+import hashlib
+import logging
+import tempfile
+from flask import Request, current_app
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+try:
+    from streaming_form_data import StreamingFormDataParser
+    from streaming_form_data.targets import FileTarget
+except ImportError:
+    StreamingFormDataParser = None
+    logger.info("streaming-form-data not installed, uploads will use the Werkzeug form parser")
+
+# Size of each read from the request body and write to disk; large enough that a
+# 16 MB upload is a handful of syscalls, small enough to bound per-upload memory
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# File parts up to this size stay in memory, as with Werkzeug's default stream factory
+SPOOL_IN_MEMORY_LIMIT = 500 * 1024
+
+class UploadRejected(Exception):
+    """Raised when a streamed upload's filename is refused before any of it is stored."""
+
+    def __init__(self, filename):
+        super().__init__(f"Upload rejected: {filename}")
+        self.filename = filename
+
+if StreamingFormDataParser is not None:
+    class HashingFileTarget(FileTarget):
+        """File target that counts and hashes the bytes it writes."""
+
+        def __init__(self, *args, accept_filename=None, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.size = 0
+            self.hasher = hashlib.sha256()
+            self.accept_filename = accept_filename
+
+        def on_start(self):
+            # The part headers have been read but none of the body; refuse before opening the file.
+            # A form submitted with no file chosen sends an empty filename, which the caller
+            # reports as a missing file rather than a refused one.
+            if self.accept_filename and self.multipart_filename and not self.accept_filename(self.multipart_filename):
+                raise UploadRejected(self.multipart_filename)
+            super().on_start()
+
+        def on_data_received(self, chunk):
+            self.size += len(chunk)
+            self.hasher.update(chunk)
+            super().on_data_received(chunk)
+
+class UploadRequest(Request):
+    """Request class that spools large file parts into the upload folder instead of the system temp dir."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload_folder = current_app.config.get('UPLOAD_FOLDER')
+        if not upload_folder or (total_content_length is not None and total_content_length <= SPOOL_IN_MEMORY_LIMIT):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        # Removed when the request closes its files; save_file_storage links it into place first
+        return tempfile.NamedTemporaryFile('wb+', dir=upload_folder, prefix='.upload-', suffix='.part')
+
+def unique_upload_filename(filename):
+    """
+    Build a collision-free, time-sortable name for a stored upload.
+
+    The prefix is ULID-shaped: 48 bits of millisecond time followed by 64
+    random bits, hex encoded, so names sort by upload time and concurrent
+    uploads of the same file (even within one second, across workers)
+    never overwrite each other.
+
+    Args:
+        filename (str): Original filename from the client
+
+    Returns:
+        str: ``<time><random>_<secure filename>``
+    """
+    return f"{time.time_ns() // 1_000_000:012x}{secrets.token_hex(8)}_{secure_filename(filename)}"
+
+def streaming_upload_available(request):
+    """
+    Check whether a request can be handled by the streaming parser.
+
+    Args:
+        request: The current Flask request
+
+    Returns:
+        bool: True if the parser is installed and the body is multipart
+    """
+    return StreamingFormDataParser is not None and request.mimetype == 'multipart/form-data'
+
+def receive_streamed_upload(request, field_name, upload_folder, accept_filename=None):
+    """
+    Stream a single file field of a multipart request into the upload folder.
+
+    The file is written under a temporary name; callers rename it once the
+    upload has been accepted.
+
+    Args:
+        request: The current Flask request (its form must not have been read yet)
+        field_name (str): Name of the file field in the form
+        upload_folder (str): Directory the file is written to
+        accept_filename (callable): Optional check on the client filename, run as soon
+            as the part headers arrive; a refused file raises UploadRejected without
+            the rest of the body being read or anything written to disk
+
+    Returns:
+        dict: 'path', 'filename', 'content_type', 'size' and 'sha256' of the upload,
+            or None if the field was missing or empty
+    """
+    temp_path = os.path.join(upload_folder, f".upload-{uuid.uuid4().hex}.part")
+
+    parser = StreamingFormDataParser(headers=request.headers)
+    target = HashingFileTarget(temp_path, accept_filename=accept_filename)
+    parser.register(field_name, target)
+
+    try:
+        while True:
+            chunk = request.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            parser.data_received(chunk)
+    except Exception:
+        discard_upload(temp_path)
+        raise
+
+    if not target.multipart_filename:
+        discard_upload(temp_path)
+        return None
+
+    return {
+        'path': temp_path,
+        'filename': target.multipart_filename,
+        'content_type': target.multipart_content_type or 'application/octet-stream',
+        'size': target.size,
+        'sha256': target.hasher.hexdigest()
+    }
+
+def save_file_storage(file, path):
+    """
+    Write a Werkzeug FileStorage to disk, sizing and hashing it in the same pass.
+
+    A part already spooled into the destination directory by UploadRequest is
+    hard-linked into place and only read back for the hash.
+
+    Args:
+        file: The uploaded FileStorage
+        path (str): Destination path
+
+    Returns:
+        tuple: (size in bytes, hex SHA-256 digest)
+    """
+    size = 0
+    hasher = hashlib.sha256()
+
+    spool_path = getattr(file.stream, 'name', None)
+    if isinstance(spool_path, str) and os.path.dirname(spool_path) == os.path.dirname(path):
+        file.stream.flush()
+        os.link(spool_path, path)
+        file.stream.seek(0)
+        while True:
+            chunk = file.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            hasher.update(chunk)
+        return size, hasher.hexdigest()
+
+    with open(path, 'wb') as destination:
+        while True:
+            chunk = file.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            hasher.update(chunk)
+            destination.write(chunk)
+    return size, hasher.hexdigest()
+
+def discard_upload(path):
+    """Remove a partially received or rejected upload, ignoring missing files."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove upload {path}: {str(e)}")
@@ -0,0 +1,73 @@
+"""
+User cache for the per-request Flask-Login user lookup.
+
+The user's column values are cached under ``user:<id>`` and turned back into a
+session-attached ``User`` without a SELECT, so authenticated requests skip the
+user query until the entry expires or is invalidated.
+"""
+import logging
+from sqlalchemy.orm import make_transient_to_detached
+from app import db, cache
+from models import User
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached user row stays valid
+USER_CACHE_TIMEOUT = 300
+
+# Credentials never go to the shared cache server
+USER_CACHE_EXCLUDED_COLUMNS = frozenset({'password_hash', 'api_key'})
+
+# Columns restored from the cache; the excluded columns and relationships are lazy-loaded on demand
+USER_CACHE_COLUMNS = tuple(
+    column.key for column in User.__table__.columns if column.key not in USER_CACHE_EXCLUDED_COLUMNS
+)
+
+def _cache_key(user_id):
+    return f"user:{user_id}"
+
+def load_cached_user(user_id):
+    """
+    Load a user for Flask-Login, reading the row from the cache when possible.
+
+    Args:
+        user_id (int): ID of the user
+
+    Returns:
+        User: A session-attached user, or None if it doesn't exist
+    """
+    try:
+        values = cache.get(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"User cache read failed for user {user_id}: {str(e)}")
+        values = None
+
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        # load=False attaches the cached state without re-selecting the row
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        try:
+            cache.set(
+                _cache_key(user_id),
+                {column: getattr(user, column) for column in USER_CACHE_COLUMNS},
+                timeout=USER_CACHE_TIMEOUT
+            )
+        except Exception as e:
+            logger.warning(f"User cache write failed for user {user_id}: {str(e)}")
+    return user
+
+def invalidate_cached_user(user_id):
+    """
+    Drop the cached row for a user after their record changes.
+
+    Args:
+        user_id (int): ID of the user
+    """
+    try:
+        cache.delete(_cache_key(user_id))
+    except Exception as e:
+        logger.warning(f"Failed to invalidate user cache for user {user_id}: {str(e)}")